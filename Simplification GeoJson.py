@@ -1,15 +1,138 @@
-import geopandas as gpd
-
-def simplify_geometries(tolerance):
-    """Simplifie les géométries pour réduire la taille"""
-    # Communes
-    gdf_com = gpd.read_file("data/communes.geojson")
-    gdf_com['geometry'] = gdf_com['geometry'].simplify(tolerance)
-    gdf_com.to_file("data/communes_simple.geojson", driver='GeoJSON')
-    
-    # EPCI
-    gdf_epci = gpd.read_file("data/epci.geojson")
-    gdf_epci['geometry'] = gdf_epci['geometry'].simplify(tolerance)
-    gdf_epci.to_file("data/epci_simple.geojson", driver='GeoJSON')
-    
-simplify_geometries(0.0008)
\ No newline at end of file
+import argparse
+import json
+import os
+import geopandas as gpd
+import shapely
+from utils.geometries import BUNDLE_DIR, BUNDLES_KEY, GEOMETRY_DIR, LEVELS, MANIFEST_PATH, MEMBERSHIP_PATH
+from utils.topojson import encode_topojson
+
+# Couches sources (IGN - Admin Express)
+SOURCES = {
+    'communes': "data/communes.geojson",
+    'epci': "data/epci.geojson",
+}
+# Grille de quantification des coordonnées (~10 m) et décimales écrites
+GRID_SIZE = 0.0001
+COORDINATE_PRECISION = 4
+
+
+def simplify_geometries(geometries, tolerance):
+    """Simplifie une couverture en conservant les frontières communes alignées"""
+    # coverage_simplify simplifie chaque arête partagée une seule fois pour les deux polygones
+    simplified = shapely.coverage_simplify(geometries, tolerance)
+    # Quantification : les sommets partagés tombent sur les mêmes points de grille
+    return shapely.set_precision(simplified, GRID_SIZE)
+
+
+def build_layer(layer, source, output_dir):
+    """Produit les niveaux de détail d'une couche et retourne leurs statistiques"""
+    gdf = gpd.read_file(source)
+    # Géométries réparées, en ne gardant que les parties surfaciques
+    geometries = shapely.make_valid(gdf.geometry.to_numpy(), method='structure', keep_collapsed=False)
+    if not shapely.coverage_is_valid(geometries):
+        print(f"[{layer}] attention : la couverture source contient des chevauchements ou des interstices")
+    levels = {}
+    for level, tolerance in LEVELS.items():
+        out = gdf.copy()
+        out['geometry'] = simplify_geometries(geometries, tolerance)
+        path = os.path.join(output_dir, f"{layer}_{level}.geojson")
+        out.to_file(path, driver='GeoJSON', COORDINATE_PRECISION=COORDINATE_PRECISION)
+        # Version topologique : frontières partagées stockées une fois, coordonnées entières
+        topo_path = os.path.join(output_dir, f"{layer}_{level}.topojson")
+        topology = encode_topojson(out.to_geo_dict()['features'], layer, GRID_SIZE)
+        with open(topo_path, 'w', encoding='utf-8') as f:
+            json.dump(topology, f, separators=(',', ':'), ensure_ascii=False)
+        levels[level] = {
+            'path': path.replace(os.sep, '/'),
+            'topojson': topo_path.replace(os.sep, '/'),
+            'tolerance': tolerance,
+            'features': len(out),
+            'vertices': int(shapely.get_num_coordinates(out.geometry.values).sum()),
+            'arcs': len(topology['arcs']),
+            'bytes': os.path.getsize(path),
+            'topojson_bytes': os.path.getsize(topo_path),
+        }
+        print(f"[{layer}] {level}: {levels[level]['vertices']} sommets, "
+              f"{levels[level]['bytes'] / 1e6:.2f} Mo (GeoJSON), {levels[level]['topojson_bytes'] / 1e6:.2f} Mo (TopoJSON)")
+    return levels
+
+
+def repair_text(value):
+    """Répare un texte UTF-8 décodé en latin-1 (« LoudÃ©ac » -> « Loudéac ») ; inchangé sinon"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return value.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return value
+
+
+def build_membership(communes_source, epci_source, path=MEMBERSHIP_PATH):
+    """Rattache chaque commune à l'EPCI qui contient son point représentatif et écrit la table
+
+    Les communes hors de tout EPCI (îles de Bréhat, Sein, Ouessant) ne sont pas rattachées : leurs
+    valeurs EPCI sont publiées sous un pseudo-EPCI propre, pas sous celui d'un voisin.
+    """
+    communes = gpd.read_file(communes_source)
+    epci = gpd.read_file(epci_source)[['code', 'nom', 'geometry']].rename(
+        columns={'code': 'code_epci', 'nom': 'nom_epci'})
+    # Point représentatif : toujours à l'intérieur de la commune, contrairement au centroïde
+    points = gpd.GeoDataFrame({'code_commune': communes['code']},
+                              geometry=communes.geometry.representative_point(), crs=communes.crs)
+    # Noms doublement encodés dans certaines couches sources : réparés avant d'atteindre libelle_epci
+    epci['nom_epci'] = epci['nom_epci'].map(repair_text)
+    columns = ['code_commune', 'code_epci', 'nom_epci']
+    membership = gpd.sjoin(points, epci, how='left', predicate='within').drop_duplicates('code_commune')[columns]
+    # Communes hors de toute couche EPCI : écartées de la table plutôt que rattachées à un voisin
+    missing = membership['code_epci'].isna()
+    if missing.any():
+        print(f"[appartenance] {int(missing.sum())} communes sans EPCI, non rattachées : "
+              f"{', '.join(sorted(membership.loc[missing, 'code_commune']))}")
+        membership = membership[~missing]
+    membership = membership.sort_values('code_commune')
+    membership.to_csv(path, index=False, encoding='utf-8')
+    print(f"[appartenance] {len(membership)} communes, {membership['code_epci'].nunique()} EPCI")
+    return membership
+
+
+def build_bundles(communes_path, membership, output_dir=BUNDLE_DIR):
+    """Écrit pour chaque EPCI la topologie de ses seules communes, au niveau de détail fin"""
+    os.makedirs(output_dir, exist_ok=True)
+    communes = gpd.read_file(communes_path)
+    features = {feature['properties']['code']: feature for feature in communes.to_geo_dict()['features']}
+    bundles = {}
+    for code_epci, members in membership.groupby('code_epci')['code_commune']:
+        topology = encode_topojson([features[code] for code in members if code in features], 'communes', GRID_SIZE)
+        path = os.path.join(output_dir, f"{code_epci}.topojson")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(topology, f, separators=(',', ':'), ensure_ascii=False)
+        bundles[code_epci] = {
+            'topojson': path.replace(os.sep, '/'),
+            'features': len(members),
+            'bytes': os.path.getsize(path),
+        }
+    print(f"[communes par EPCI] {len(bundles)} fichiers, "
+          f"{max(info['bytes'] for info in bundles.values()) / 1e3:.0f} ko au plus")
+    return bundles
+
+
+def build_geometries(sources, output_dir=GEOMETRY_DIR, manifest_path=MANIFEST_PATH, membership_path=MEMBERSHIP_PATH):
+    """Construit toutes les couches, la table d'appartenance et les géométries par EPCI, puis écrit le manifeste"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {layer: build_layer(layer, source, output_dir) for layer, source in sources.items()}
+    membership = build_membership(sources['communes'], sources['epci'], membership_path)
+    manifest[BUNDLES_KEY] = build_bundles(manifest['communes']['fin']['path'], membership,
+                                          os.path.join(output_dir, os.path.basename(BUNDLE_DIR)))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère les géométries multi-résolution et leur manifeste")
+    parser.add_argument("--communes", default=SOURCES['communes'], help="GeoJSON source des communes")
+    parser.add_argument("--epci", default=SOURCES['epci'], help="GeoJSON source des EPCI")
+    parser.add_argument("--output", default=GEOMETRY_DIR, help="Dossier de sortie")
+    parser.add_argument("--appartenance", default=MEMBERSHIP_PATH, help="Table d'appartenance commune -> EPCI")
+    args = parser.parse_args()
+    build_geometries({'communes': args.communes, 'epci': args.epci}, args.output,
+                     os.path.join(args.output, os.path.basename(MANIFEST_PATH)), args.appartenance)
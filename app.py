@@ -1,10 +1,7 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from PIL import Image
 import importlib
-import sys
 import os
+from datetime import datetime
 
 # Configuration de la page
 st.set_page_config(
@@ -13,70 +10,34 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded")
 
-# Chargement du logo
-logo = Image.open('assets/logo.jpg')
+# Les données ne sont pas chargées ici : chaque page charge (une fois par processus)
+# les mailles dont elle a besoin, et la page « À propos » n'en charge aucune
 
-# Chargement des données
-@st.cache_data
-def load_data():
-    df = pd.read_csv('data/final_df_communes.csv')
-    # Conversion des dates en format datetime
-    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y', errors='coerce')
-    # Suppression des lignes avec dates invalides si nécessaire
-    df['code_commune'] = df['code_commune'].astype(str)
-    df = df.dropna(subset=['date'])
-    return df
 
-@st.cache_data
-def load_epci_data():
-    # Charger les données EPCI (à adapter selon votre fichier)
-    try:
-        epci_df = pd.read_csv('data/final_df_epci.csv')
-        epci_df.rename(columns={'nom':'libelle_epci'}, inplace=True)
-        epci_df['date'] = pd.to_datetime(epci_df['date'], format='%d/%m/%Y', errors='coerce')
-        epci_df['code_epci'] = epci_df['code_epci'].astype(str)
-        return epci_df
-    except FileNotFoundError:
-        return None
-
-# Charger les données
-df = load_data()
-epci_df = load_epci_data()
-
-# Charger le mapping des indicateurs
-try:
-    mapping_df = pd.read_csv("data/columns_indicateurs.csv", sep=";")
-except:
-    # Créer un mapping par défaut si le fichier n'existe pas
-    mapping_df = pd.DataFrame({
-        'Indicateur': df['indicateur'].unique(),
-        'Thématique': ['Non classé'] * len(df['indicateur'].unique()),
-        'Nouveau_nom_indicateur': df['indicateur'].unique()
-    })
+def show_data_info():
+    """Statistiques de la barre latérale, lues dans le catalogue (data/catalogue.json)"""
+    # Import local : utils.chargement charge pandas et pyarrow, inutiles à la page « À propos »
+    from utils.chargement import load_catalog
 
-def add_thematique_column(df):
-    if df is None:
-        return None
+    st.divider()
+    st.subheader("📊 Informations")
     
-    # Créer un dictionnaire à partir des deux colonnes
-    thematiques = dict(zip(mapping_df['Indicateur'], mapping_df['Thématique']))
-    nouveau_nom = dict(zip(mapping_df['Indicateur'], mapping_df['Nouveau_nom_indicateur']))
+    mailles = load_catalog()['mailles']
+    communes_meta = mailles.get('Commune')
+    epci_meta = mailles.get('EPCI')
     
-    # Appliquer le mapping
-    df['thematique'] = df['indicateur'].map(thematiques)
-    # Remplacer les valeurs manquantes par l'original
-    df['thematique'] = df['thematique'].fillna('Non classé')
+    if communes_meta:
+        if communes_meta.get('date_max'):
+            date_max = datetime.strptime(communes_meta['date_max'], '%Y-%m-%d')
+            st.caption(f"Données mises à jour le: {date_max.strftime('%d/%m/%Y')}")
+        st.caption(f"Indicateurs communaux: {communes_meta['indicateurs']}")
     
-    # Renommer les indicateurs
-    df['indicateur'] = df['indicateur'].map(nouveau_nom)
-    df['indicateur'] = df['indicateur'].fillna(df['indicateur'])
+    if epci_meta:
+        st.caption(f"Indicateurs EPCI: {epci_meta['indicateurs']}")
     
-    return df
+    if communes_meta and communes_meta.get('thematiques') is not None:
+        st.caption(f"Thématiques: {communes_meta['thematiques']}")
 
-# Appliquer les thématiques
-df = add_thematique_column(df)
-if epci_df is not None:
-    epci_df = add_thematique_column(epci_df)
 
 # Définir les pages disponibles
 # Vérifier d'abord quelles pages existent
@@ -85,6 +46,7 @@ pages_to_check = [
     ("🏠 Accueil", "accueil"),
     ("🗺️ Cartes", "cartes"), 
     ("📊 Données brutes", "donnees_brutes"),
+    ("🔬 Analyses", "analyses"),
     ("ℹ️ À propos", "a_propos")
 ]
 
@@ -104,32 +66,25 @@ if not available_pages:
 st.markdown("""<style>
     [data-testid="stSidebarNav"] {display: none;}</style>""", unsafe_allow_html=True)
 with st.sidebar:
-    st.image(logo, width=200)
+    st.image('assets/logo.jpg', width=200)
     st.title("Navigation")
     
     # Créer la liste des pages disponibles
     page_options = [name for name, _ in available_pages]
     
-    # Navigation
+    # Navigation (page demandée par un lien partagé, ex. ?page=donnees_brutes)
+    requested_page = st.query_params.get("page")
+    default_index = next((i for i, (_, page_file) in enumerate(available_pages) if page_file == requested_page), 0)
     selected_page_name = st.radio(
         "Sélectionnez une page",
         options=page_options,
+        index=default_index,
         label_visibility="collapsed"
     )
     
-    # Ajouter des informations utiles
-    st.divider()
-    st.subheader("📊 Informations")
-    
-    if df is not None and not df.empty:
-        st.caption(f"Données mises à jour le: {df['date'].max().strftime('%d/%m/%Y')}")
-        st.caption(f"Indicateurs communaux: {df['indicateur'].nunique()}")
-    
-    if epci_df is not None and not epci_df.empty:
-        st.caption(f"Indicateurs EPCI: {epci_df['indicateur'].nunique()}")
-    
-    if 'thematique' in df.columns:
-        st.caption(f"Thématiques: {df['thematique'].nunique()}")
+    # Ajouter des informations utiles (sauf sur « À propos », qui ne charge aucune donnée)
+    if dict(available_pages).get(selected_page_name) != "a_propos":
+        show_data_info()
 
 # Trouver le module correspondant à la page sélectionnée
 selected_module = None
@@ -144,39 +99,13 @@ if selected_module:
         # Importer dynamiquement le module
         module = importlib.import_module(f"pages.{selected_module}")
         
-        # Appeler la fonction show avec les bons paramètres
-        if selected_module == "accueil":
-            module.show(df, epci_df)
-        elif selected_module == "cartes":
-            module.show(df, epci_df)
-        elif selected_module == "donnees_brutes":
-            module.show(df, epci_df)
-        elif selected_module == "a_propos":
-            module.show()
-        else:
-            # Essayer d'appeler show avec les paramètres par défaut
-            try:
-                module.show(df, epci_df)
-            except:
-                try:
-                    module.show(df)
-                except:
-                    module.show()
-                    
+        # Chaque page charge elle-même ses données
+        module.show()
+        
     except Exception as e:
         st.error(f"Erreur lors du chargement de la page: {e}")
-        st.info("Affichage de la page par défaut...")
-        
-        # Afficher une page par défaut
-        if selected_module == "cartes":
-            from pages import cartes
-            cartes.show(df, epci_df)
-        elif selected_module == "donnees_brutes":
-            import pages.donnees_brutes
-            pages.donnees_brutes.show(df,epci_df)
-        else:
-            st.title(f"Page: {selected_page_name}")
-            st.write("Cette page est en cours de développement.")
+        st.title(f"Page: {selected_page_name}")
+        st.write("Cette page est en cours de développement.")
 else:
     st.error("Page non trouvée")
 
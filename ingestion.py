@@ -0,0 +1,383 @@
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import numpy as np
+import pandas as pd
+from utils.agregation import aggregation_rules
+from utils.catalogue import CATALOGUE_PATH, build_catalogue, indicator_sources, load_catalogue, write_catalogue
+from utils.donnees import (CODE_COLUMNS, CSV_PATHS, DATA_DIR, LABEL_COLUMNS, PARTITION_DIR, PARTITION_MANIFEST_PATH,
+                           PLACEHOLDER_EPCI_CODES, add_thematique_column, aggregated_pseudo_epci, build_epci_dataset,
+                           compact_dataset, harmonize_epci_labels, keep_upstream_rows, load_mapping,
+                           maille_manifest_path, partition_file, read_maille_manifest, read_partition_manifest,
+                           read_partitions, write_partition_manifest, write_snapshot)
+from utils.geometries import MEMBERSHIP_PATH, load_membership
+from utils.index import sort_for_partitions
+
+# Fichiers sources bruts déposés par maille (en plus du CSV historique de CSV_PATHS)
+SOURCE_DIR = os.path.join(DATA_DIR, "sources")
+# À incrémenter quand la préparation des partitions change : toutes sont alors reconstruites
+FORMAT_VERSION = 2
+DATE_FORMAT = '%d/%m/%Y'
+# Nombre d'exemples de valeurs rejetées affichés par indicateur
+MAX_EXAMPLES = 3
+
+
+def source_files(maille):
+    """CSV sources d'une maille : CSV historique, puis data/sources/<maille>/*.csv par ordre alphabétique"""
+    paths = [CSV_PATHS[maille]] if os.path.exists(CSV_PATHS[maille]) else []
+    return paths + sorted(glob.glob(os.path.join(SOURCE_DIR, maille, "*.csv")))
+
+
+def read_sources(maille):
+    """Lignes brutes (texte, non converties) de toutes les sources d'une maille (None sans source)"""
+    code_col, label_col = CODE_COLUMNS[maille], LABEL_COLUMNS[maille]
+    frames = []
+    for path in source_files(maille):
+        df = pd.read_csv(path, dtype=str)
+        if maille == 'EPCI':
+            df = df.rename(columns={'nom': label_col})
+            # Lignes « Sans objet » : aucun territoire
+            df = df[~df[code_col].isin(PLACEHOLDER_EPCI_CODES)]
+        missing = [col for col in (code_col, 'date', 'indicateur', 'valeur') if col not in df.columns]
+        if missing:
+            raise ValueError(f"{path} : colonnes manquantes ({', '.join(missing)})")
+        if label_col not in df.columns:
+            df[label_col] = None
+        frames.append(df[[label_col, code_col, 'date', 'indicateur', 'valeur']])
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def display_names(indicateurs, mapping_df):
+    """Nom affiché de chaque indicateur brut (celui des partitions et de l'application)"""
+    if mapping_df is None:
+        return indicateurs
+    renamed = dict(zip(mapping_df['Indicateur'], mapping_df['Nouveau_nom_indicateur'].fillna(mapping_df['Indicateur'])))
+    return indicateurs.map(lambda ind: renamed.get(ind, ind))
+
+
+def content_hashes(raw, names, mapping_df):
+    """Empreinte du contenu source de chaque indicateur (nom affiché)
+
+    Couvre les lignes brutes dans l'ordre des sources et la ligne de la table de correspondance :
+    un renommage ou un changement de thématique reconstruit aussi la partition.
+    """
+    mapping_rows = {}
+    if mapping_df is not None:
+        for row in mapping_df.itertuples(index=False):
+            mapping_rows[row.Indicateur] = '|'.join(str(value) for value in row)
+    row_hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    hashes = {}
+    for name, positions in raw.groupby(names.to_numpy(), sort=True).indices.items():
+        digest = hashlib.sha256(f"{FORMAT_VERSION}".encode())
+        for ind in sorted(raw['indicateur'].iloc[positions].unique()):
+            digest.update(mapping_rows.get(ind, ind).encode('utf-8'))
+        digest.update(row_hashes[positions].tobytes())
+        hashes[name] = digest.hexdigest()
+    return hashes
+
+
+def validate(raw, names):
+    """Convertit dates et valeurs une fois pour toutes, avant l'écriture des partitions
+
+    Les lignes à date illisible sont écartées ; les valeurs non numériques deviennent manquantes.
+    Retourne (lignes valides, rejets par indicateur affiché).
+    """
+    dates = pd.to_datetime(raw['date'], format=DATE_FORMAT, errors='coerce')
+    valeurs = pd.to_numeric(raw['valeur'], errors='coerce')
+    bad_dates = dates.isna().to_numpy()
+    bad_values = (valeurs.isna() & raw['valeur'].notna()).to_numpy()
+    rejets = {}
+    for name in np.unique(names.to_numpy()[bad_dates | bad_values]):
+        rows = (names == name).to_numpy()
+        examples = raw.loc[rows & bad_dates, 'date'].fillna('(vide)').unique()[:MAX_EXAMPLES]
+        rejets[name] = {
+            'dates_invalides': int((rows & bad_dates).sum()),
+            'valeurs_invalides': int((rows & bad_values & ~bad_dates).sum()),
+            'exemples': [str(example) for example in examples],
+        }
+    df = raw.assign(date=dates, valeur=valeurs)
+    return df.loc[~bad_dates].reset_index(drop=True), rejets
+
+
+def report_rejects(maille, rejets):
+    """Affiche les lignes écartées ou corrigées à l'ingestion, par indicateur"""
+    for name, rejet in sorted(rejets.items()):
+        if rejet['dates_invalides']:
+            print(f"[{maille}] {name} : {rejet['dates_invalides']} lignes écartées, date illisible "
+                  f"(attendu jj/mm/aaaa, ex. {', '.join(repr(e) for e in rejet['exemples'])})")
+        if rejet['valeurs_invalides']:
+            print(f"[{maille}] {name} : {rejet['valeurs_invalides']} valeurs non numériques remplacées par des manquants")
+
+
+def file_hash(path):
+    """Empreinte d'un fichier (None s'il est absent)"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def write_partitions(maille, df, hashes, rejets, changed):
+    """Écrit une partition par indicateur affiché ; retourne les entrées du manifeste
+
+    Un indicateur modifié sans aucune ligne valide a une entrée sans fichier : son empreinte est
+    connue et il n'est pas relu à chaque ingestion tant que ses sources ne changent pas.
+    """
+    entries = {}
+    os.makedirs(os.path.join(PARTITION_DIR, maille), exist_ok=True)
+    df = sort_for_partitions(compact_dataset(df))
+    for name, positions in df.groupby('indicateur', observed=True, sort=True).indices.items():
+        fichier = partition_file(maille, name, hashes[name])
+        path = os.path.join(PARTITION_DIR, fichier)
+        part = df.iloc[positions].reset_index(drop=True)
+        write_snapshot(part, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        entries[name] = {'fichier': fichier, 'empreinte': hashes[name], 'lignes': int(len(part))}
+    for name in sorted(set(changed) - set(entries)):
+        entries[name] = {'fichier': None, 'empreinte': hashes[name], 'lignes': 0}
+    for name in set(rejets) & set(entries):
+        entries[name]['rejets'] = rejets[name]
+    return entries
+
+
+def validated_rows(maille, raw, names, changed, mapping_df, strict=False):
+    """Lignes sources des indicateurs modifiés, validées et renommées (avec thématique), et leurs rejets"""
+    selected = names.isin(changed).to_numpy()
+    df, rejets = validate(raw.loc[selected].reset_index(drop=True), names[selected].reset_index(drop=True))
+    report_rejects(maille, rejets)
+    if strict and rejets:
+        raise ValueError(f"[{maille}] lignes invalides (--strict)")
+    # Même valeur (territoire, indicateur, date) dans plusieurs sources : la dernière source l'emporte
+    df = df.drop_duplicates([CODE_COLUMNS[maille], 'indicateur', 'date'], keep='last')
+    return add_thematique_column(df, mapping_df), rejets
+
+
+def prepare_raw(maille, mapping_df, previous, force=False, strict=False):
+    """Partitions d'une maille à partir de ses sources : seuls les indicateurs dont l'empreinte change sont relus
+
+    Retourne (entrées du manifeste, indicateurs reconstruits), ou (None, None) sans source.
+    """
+    raw = read_sources(maille)
+    if raw is None:
+        return None, None
+    names = display_names(raw['indicateur'], mapping_df)
+    hashes = content_hashes(raw, names, mapping_df)
+    changed = sorted(name for name, empreinte in hashes.items()
+                     if force or previous.get(name, {}).get('empreinte') != empreinte)
+    entries = {name: entry for name, entry in previous.items() if name in hashes and name not in changed}
+    if not changed:
+        return entries, changed
+
+    df, rejets = validated_rows(maille, raw, names, changed, mapping_df, strict)
+    entries.update(write_partitions(maille, df, hashes, rejets, changed))
+    return entries, changed
+
+
+def aggregated_indicators(commune_entries, rules):
+    """Indicateurs EPCI calculables depuis les partitions communales (règle, données et poids présents)"""
+    return sorted(name for name, (rule, weight) in rules.items()
+                  if name in commune_entries and (rule != 'moyenne_ponderee' or weight in commune_entries))
+
+
+def epci_hashes(commune_entries, rules, membership_hash, upstream_hashes):
+    """Empreinte de chaque indicateur EPCI : partitions communales agrégées, sources EPCI et appartenance"""
+    aggregated = set(aggregated_indicators(commune_entries, rules))
+    hashes = {}
+    for name in aggregated | set(upstream_hashes):
+        aggregation = None
+        if name in aggregated:
+            rule, weight = rules[name]
+            weight_hash = commune_entries.get(weight, {}).get('empreinte') if weight else None
+            aggregation = f"{rule}|{weight}|{commune_entries[name]['empreinte']}|{weight_hash}"
+        key = f"{FORMAT_VERSION}|{aggregation}|{upstream_hashes.get(name)}|{membership_hash}"
+        hashes[name] = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return hashes
+
+
+def report_epci_coverage(commune_entries, rules, upstream_hashes, upstream_codes, membership, strict=False):
+    """Signale les indicateurs EPCI non agrégés faute de poids et les EPCI sans commune rattachée"""
+    unweighted = sorted(name for name, (rule, weight) in rules.items()
+                        if name in commune_entries and rule == 'moyenne_ponderee' and weight not in commune_entries)
+    kept = [name for name in unweighted if name in upstream_hashes]
+    missing = [name for name in unweighted if name not in upstream_hashes]
+    if kept:
+        print(f"[EPCI] indicateur de pondération absent des communes, valeurs des sources EPCI conservées : "
+              f"{', '.join(kept)}")
+    if missing:
+        message = (f"[EPCI] indicateur de pondération absent des communes et aucune valeur dans les sources EPCI, "
+                   f"indicateurs absents de la maille EPCI : {', '.join(missing)}")
+        if strict:
+            raise ValueError(f"{message} (--strict)")
+        print(message)
+    duplicates = aggregated_pseudo_epci(set(upstream_codes), membership)
+    if duplicates:
+        print(f"[EPCI] pseudo-EPCI de communes déjà agrégées dans un EPCI, valeurs des sources écartées : "
+              f"{', '.join(sorted(duplicates))}")
+    outside = sorted(set(upstream_codes) - set(membership) - duplicates)
+    if outside:
+        print(f"[EPCI] {len(outside)} EPCI des sources sans commune dans la table d'appartenance, "
+              f"valeurs des sources conservées : {', '.join(outside)}")
+
+
+def prepare_epci(mapping_df, manifest, previous, force=False, strict=False):
+    """Partitions EPCI agrégées depuis les partitions communales, pour les seuls indicateurs modifiés
+
+    Les sources EPCI complètent l'agrégation : indicateurs non agrégés (sans règle, ou moyenne
+    pondérée sans indicateur de pondération) et EPCI sans commune rattachée gardent leurs valeurs
+    amont. Retourne (entrées du manifeste, indicateurs reconstruits), ou (None, None) si l'agrégation
+    est impossible (communes, table d'appartenance ou règles manquantes).
+    """
+    # Indicateurs communaux sans aucune ligne valide : comme absents
+    commune_partitions = manifest['mailles'].get('Commune', {}).get('partitions', {})
+    commune_entries = {name: entry for name, entry in commune_partitions.items() if entry.get('fichier')}
+    rules = aggregation_rules(mapping_df)
+    membership = load_membership()
+    if not commune_entries or not membership or not rules:
+        return None, None
+    raw = read_sources('EPCI')
+    names = None if raw is None else display_names(raw['indicateur'], mapping_df)
+    upstream_hashes = {} if raw is None else content_hashes(raw, names, mapping_df)
+    upstream_codes = [] if raw is None else raw[CODE_COLUMNS['EPCI']].dropna().unique()
+    report_epci_coverage(commune_entries, rules, upstream_hashes, upstream_codes, membership, strict)
+    hashes = epci_hashes(commune_entries, rules, file_hash(MEMBERSHIP_PATH), upstream_hashes)
+    changed = sorted(name for name, empreinte in hashes.items()
+                     if force or previous.get(name, {}).get('empreinte') != empreinte)
+    entries = {name: entry for name, entry in previous.items() if name in hashes and name not in changed}
+    if not changed:
+        return entries, changed
+
+    upstream_df, rejets = None, {}
+    if raw is not None and names.isin(changed).any():
+        upstream_df, rejets = validated_rows('EPCI', raw, names, changed, mapping_df, strict)
+    to_aggregate = sorted(set(changed) & set(aggregated_indicators(commune_entries, rules)))
+    if to_aggregate:
+        # Partitions communales des indicateurs modifiés et de leurs indicateurs de pondération
+        needed = set(to_aggregate) | {rules[name][1] for name in to_aggregate if rules[name][1]}
+        commune_df = compact_dataset(read_partitions('Commune', manifest, needed))
+        df, _ = build_epci_dataset(commune_df, mapping_df, membership, upstream_df)
+    else:
+        df = harmonize_epci_labels(keep_upstream_rows(upstream_df, membership), membership)
+    df = df[df['indicateur'].isin(changed)]
+    entries.update(write_partitions('EPCI', df, hashes, rejets, changed))
+    return entries, changed
+
+
+def maille_version(entries):
+    """Version d'une maille : empreinte de la liste de ses partitions"""
+    digest = hashlib.sha256()
+    for name, entry in sorted(entries.items()):
+        digest.update(f"{name}|{entry['empreinte']}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def remove_stale_partitions(manifest):
+    """Supprime les partitions et manifestes de maille d'au moins deux générations
+
+    La génération précédente est conservée : une session qui l'a déjà en cache, ou qui lit
+    pendant l'ingestion, trouve encore ses fichiers.
+    """
+    kept_manifests, referenced = set(), set()
+    for maille, description in manifest['mailles'].items():
+        for version in {description['version'], manifest.get('versions_precedentes', {}).get(maille)} - {None}:
+            kept_manifests.add(os.path.normpath(maille_manifest_path(maille, version)))
+            kept = read_maille_manifest(maille, version)
+            if kept is not None:
+                referenced.update(entry['fichier'] for entry in kept['mailles'][maille]['partitions'].values()
+                                  if entry.get('fichier'))
+    for path in glob.glob(os.path.join(PARTITION_DIR, "*", "manifest-*.json")):
+        if os.path.normpath(path) not in kept_manifests:
+            os.remove(path)
+    for path in glob.glob(os.path.join(PARTITION_DIR, "*", "*.parquet")):
+        fichier = os.path.relpath(path, PARTITION_DIR).replace(os.sep, '/')
+        if fichier not in referenced:
+            os.remove(path)
+
+
+def report_written(written):
+    """Partitions écrites avant un échec : non référencées par le manifeste, donc invisibles pour l'application"""
+    if not written:
+        return "aucune partition écrite"
+    detail = ', '.join(f"{maille} : {count}" for maille, count in written.items())
+    return (f"partitions écrites ({detail}) mais manifeste non mis à jour, "
+            f"l'application garde la version précédente")
+
+
+def ingest(mailles, force=False, strict=False):
+    """Met à jour les partitions Parquet lues par l'application, puis le catalogue et le manifeste
+
+    Seuls les indicateurs dont le contenu source a changé sont reconstruits ; l'application
+    recharge les mailles dont la version change au prochain affichage.
+    """
+    mapping_df = load_mapping()
+    manifest = read_partition_manifest() or {'mailles': {}}
+    if 'Commune' in mailles and 'EPCI' not in mailles and 'EPCI' in manifest['mailles']:
+        # Agrégats EPCI calculés depuis les communes : mis à jour avec elles (indicateurs modifiés seulement)
+        print("[EPCI] agrégée depuis les communes : traitée avec elles")
+        mailles = list(mailles) + ['EPCI']
+    previous_versions = manifest.setdefault('versions_precedentes', {})
+    catalogue = load_catalogue()
+    datasets = {}
+    written = {}
+    # Les EPCI sont agrégés depuis les communes : celles-ci sont traitées d'abord
+    for maille in sorted(mailles, key=lambda m: m != 'Commune'):
+        previous = manifest['mailles'].get(maille, {}).get('partitions', {})
+        entries = changed = None
+        try:
+            if maille == 'EPCI':
+                entries, changed = prepare_epci(mapping_df, manifest, previous, force, strict)
+                if entries is None:
+                    print(f"[EPCI] agrégation impossible (communes, table d'appartenance ou règles manquantes), "
+                          f"lecture des sources EPCI")
+            if entries is None:
+                entries, changed = prepare_raw(maille, mapping_df, previous, force, strict)
+        except ValueError as error:
+            sys.exit(f"{error} : {report_written(written)}")
+        if entries is None:
+            print(f"[{maille}] aucune source ({CSV_PATHS[maille]} ou {os.path.join(SOURCE_DIR, maille)}), maille ignorée")
+            continue
+        if changed:
+            written[maille] = len(changed)
+        removed = sorted(set(previous) - set(entries))
+        print(f"[{maille}] {len(entries)} indicateurs : {len(changed)} reconstruits, "
+              f"{len(entries) - len(changed)} inchangés, {len(removed)} supprimés")
+        version = maille_version(entries)
+        old_version = manifest['mailles'].get(maille, {}).get('version')
+        if old_version and old_version != version:
+            previous_versions[maille] = old_version
+        description = {'version': version, 'partitions': dict(sorted(entries.items()))}
+        manifest['mailles'][maille] = description
+        # Manifeste propre à cette version : les caches d'une version la relisent telle quelle
+        os.makedirs(os.path.join(PARTITION_DIR, maille), exist_ok=True)
+        write_partition_manifest(description, maille_manifest_path(maille, version))
+        # Le catalogue n'est redécrit que pour les mailles modifiées (ou absentes du catalogue)
+        if changed or removed or catalogue is None or maille not in catalogue.get('mailles', {}):
+            datasets[maille] = read_partitions(maille, manifest)
+
+    if datasets:
+        catalogue = build_catalogue({m: df for m, df in datasets.items() if df is not None},
+                                    indicator_sources(mapping_df), previous=catalogue)
+        write_catalogue(catalogue)
+        print(f"Catalogue ({len(catalogue['indicateurs'])} indicateurs) -> {CATALOGUE_PATH}")
+    # Manifeste écrit en dernier : l'application ne voit la nouvelle version qu'une fois tout écrit
+    manifest['version'] = hashlib.sha256('|'.join(
+        f"{m}:{d['version']}" for m, d in sorted(manifest['mailles'].items())).encode('utf-8')).hexdigest()[:16]
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    write_partition_manifest(manifest)
+    remove_stale_partitions(manifest)
+    print(f"Manifeste (version {manifest['version']}) -> {PARTITION_MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère les partitions Parquet par indicateur à partir des CSV de data/")
+    parser.add_argument("--maille", choices=list(CSV_PATHS), action="append",
+                        help="Maille à traiter (par défaut : toutes)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reconstruit toutes les partitions, même inchangées")
+    parser.add_argument("--strict", action="store_true",
+                        help="Échoue sans mettre à jour le manifeste si des lignes sont invalides (dates illisibles, "
+                             "valeurs non numériques) ; l'application garde la version précédente")
+    args = parser.parse_args()
+    ingest(args.maille or list(CSV_PATHS), force=args.force, strict=args.strict)
@@ -1,35 +1,39 @@
 import streamlit as st
-import pandas as pd
+from utils.catalogue import list_thematiques
+from utils.chargement import load_catalog
 
-def show(df, epci_df):
+def show():
     st.title("🏠 Tableau de bord - Observatoire Régional")
     
+    # Tout est lu dans le catalogue : la page ne charge aucune donnée
+    catalogue = load_catalog()
+    communes_meta = catalogue['mailles'].get('Commune')
+    epci_meta = catalogue['mailles'].get('EPCI')
+    if communes_meta is None:
+        st.warning("Aucune donnée communale disponible")
+        return
+    
     # KPI globaux
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Nombre d'indicateurs", df['indicateur'].nunique())
+        st.metric("Nombre d'indicateurs", communes_meta['indicateurs'])
     
     with col2:
-        st.metric("Nombre de communes", df['code_commune'].nunique())
+        st.metric("Nombre de communes", communes_meta['territoires'])
     
     with col3:
-        if epci_df is not None:
-            st.metric("Nombre d'EPCI", 61)
+        if epci_meta is not None:
+            st.metric("Nombre d'EPCI", epci_meta['territoires'])
+        elif communes_meta.get('date_min') and communes_meta.get('date_max'):
+            st.metric("Période couverte", f"{communes_meta['date_min'][:4]}-{communes_meta['date_max'][:4]}")
         else:
-            st.metric("Période couverte", f"{df['date'].min().year}-{df['date'].max().year}")
+            st.metric("Période couverte", "n.d.")
     
-    # Liste des indicateurs disponibles
+    # Liste des indicateurs disponibles, par thématique
     st.subheader("📋 Indicateurs disponibles")
     
-    if 'thematique' in df.columns:
-        for thematique in df['thematique'].unique():
-            with st.expander(f"{thematique}"):
-                indicateurs = df[df['thematique'] == thematique]['indicateur'].unique()
-                for ind in indicateurs:
-                    st.write(f"• {ind}")
-    else:
-        for ind in sorted(df['indicateur'].unique()):
-
-            st.write(f"• {ind}")
-
+    for thematique, indicateurs in list_thematiques(catalogue, 'Commune').items():
+        with st.expander(f"{thematique}"):
+            for ind in indicateurs:
+                st.write(f"• {ind}")
@@ -0,0 +1,120 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+from utils.chargement import data_version, load_catalog, load_cube_version
+from utils.correlation import pairwise_correlation, strongest_pairs
+
+@st.cache_data
+def load_correlations(maille, version, date_str):
+    """Matrice territoires × indicateurs à une date et corrélations entre indicateurs, par (maille, version, date)"""
+    cube = load_cube_version(maille, version)
+    matrix = cube.cross_section(pd.Timestamp(date_str))
+    # Indicateurs sans valeur à cette date : retirés
+    keep = ~np.all(np.isnan(matrix), axis=0)
+    indicateurs = [ind for ind, kept in zip(cube.indicators, keep) if kept]
+    matrix = matrix[:, keep]
+    r, n = pairwise_correlation(matrix)
+    return indicateurs, matrix, r, n
+
+def available_dates(catalogue, maille):
+    """Dates de la maille et nombre d'indicateurs disponibles à chacune"""
+    counts = {}
+    for entry in catalogue['indicateurs'].values():
+        for date_str in entry['mailles'].get(maille, {}).get('dates', []):
+            counts[date_str] = counts.get(date_str, 0) + 1
+    return dict(sorted(counts.items()))
+
+def show():
+    st.title("🔬 Analyses croisées des indicateurs")
+    
+    catalogue = load_catalog()
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        maille = st.radio(
+            "Échelle géographique",
+            options=[m for m in ["Commune", "EPCI"] if m in catalogue['mailles']],
+            horizontal=True,
+            key="analyses_radio_echelle"
+        )
+    if maille is None:
+        st.warning("Aucune donnée disponible")
+        return
+    
+    dates = available_dates(catalogue, maille)
+    if not dates:
+        st.info(f"Aucune date disponible à l'échelle {maille} : pas de corrélation possible.")
+        return
+    with col2:
+        # Par défaut : la date où le plus d'indicateurs sont disponibles (la plus récente en cas d'égalité)
+        date_options = list(dates)
+        default_date = max(date_options, key=lambda d: (dates[d], d))
+        date_str = st.selectbox(
+            "Date",
+            options=date_options,
+            index=date_options.index(default_date),
+            format_func=lambda d: f"{pd.Timestamp(d).strftime('%d/%m/%Y')} ({dates[d]} indicateurs)",
+            key="analyses_select_date"
+        )
+    
+    # Une seule version lue : matrice et nuage de points portent sur les mêmes données
+    version = data_version(maille)
+    indicateurs, matrix, r, n = load_correlations(maille, version, date_str)
+    if len(indicateurs) < 2:
+        st.info("Moins de deux indicateurs disponibles à cette date : pas de corrélation possible.")
+        return
+    
+    # Matrice de corrélation
+    st.subheader("Matrice de corrélation (Pearson)")
+    st.caption("Calculée pour chaque paire sur les territoires renseignés pour les deux indicateurs.")
+    fig = px.imshow(
+        r,
+        x=indicateurs,
+        y=indicateurs,
+        zmin=-1,
+        zmax=1,
+        color_continuous_scale="RdBu",
+        aspect="auto",
+    )
+    fig.update_traces(
+        customdata=n,
+        hovertemplate="%{y}<br>%{x}<br>r = %{z:.2f} (%{customdata} territoires)<extra></extra>"
+    )
+    fig.update_xaxes(showticklabels=False)
+    fig.update_yaxes(showticklabels=False)
+    fig.update_layout(height=700, margin={"r": 0, "t": 10, "l": 0, "b": 0})
+    st.plotly_chart(fig, use_container_width=True, key="analyses_heatmap")
+    
+    with st.expander("🔗 Paires les plus corrélées"):
+        pairs = strongest_pairs(r, n, indicateurs, limit=15)
+        st.dataframe(
+            pd.DataFrame(pairs, columns=["Indicateur 1", "Indicateur 2", "Corrélation", "Territoires"]),
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    # Nuage de points d'une paire
+    st.subheader("Nuage de points")
+    col_x, col_y = st.columns(2)
+    with col_x:
+        ind_x = st.selectbox("Indicateur en abscisse", indicateurs, index=0, key="analyses_select_x")
+    with col_y:
+        ind_y = st.selectbox("Indicateur en ordonnée", indicateurs, index=1, key="analyses_select_y")
+    
+    i, j = indicateurs.index(ind_x), indicateurs.index(ind_y)
+    cube = load_cube_version(maille, version)
+    both = ~np.isnan(matrix[:, i]) & ~np.isnan(matrix[:, j])
+    scatter_df = pd.DataFrame({
+        'territoire': cube.labels[both] if cube.labels is not None else cube.territories[both],
+        'code': cube.territories[both],
+        ind_x: matrix[both, i],
+        ind_y: matrix[both, j],
+    })
+    if np.isnan(r[i, j]):
+        st.caption(f"Corrélation non calculable ({n[i, j]} territoires renseignés pour les deux indicateurs)")
+    else:
+        st.caption(f"r = {r[i, j]:.2f} sur {n[i, j]} territoires")
+    fig_scatter = px.scatter(scatter_df, x=ind_x, y=ind_y, hover_name='territoire', hover_data={'code': True})
+    fig_scatter.update_layout(height=550)
+    st.plotly_chart(fig_scatter, use_container_width=True, key="analyses_scatter")
@@ -1,59 +1,372 @@
 import streamlit as st
 import pandas as pd
-import json
-import requests
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime
 import numpy as np
+from plotly.colors import get_colorscale, sample_colorscale
+from utils.cache import FigureCache
+from utils.carte_webgl import geometry_bounds, show_webgl_map
+from utils.catalogue import list_dates, list_indicators, list_thematiques
+from utils.chargement import (VERSIONED_CACHE_ENTRIES, catalog_version, data_version, indicator_version, load_catalog,
+                              load_cube, load_cube_version, load_data_version, load_spatial_index)
+from utils.classification import CLASSIFICATION_METHODS, assign_classes, compute_breaks
+from utils.composant_carte import show_map_component
+from utils.donnees import CODE_COLUMNS, LABEL_COLUMNS
+from utils.geometries import (load_manifest, load_membership, read_geojson, select_bundle_path,
+                              select_geometry_path, subset_geojson)
+from utils.pagination import show_paginated_table
+from utils.recherche import SEARCH_LIMIT, SearchIndex, narrow_options
+from utils.spatial import parse_coordinates
+from utils.statistiques import (compute_change, compute_slice_statistics, describe_values, frames_range,
+                               get_slice_statistics)
 
-@st.cache_data
+# Libellé de l'échelle dans les titres des cartes
+ECHELLE_TEXTS = {'Commune': "communale", 'EPCI': "EPCI"}
+
+# Modes d'affichage de la carte
+MODE_SINGLE = "Date unique"
+MODE_CHANGE = "Comparaison de deux dates"
+MODE_ANIMATION = "Évolution animée"
+
+# Rendus de la carte
+RENDERER_COMPONENT = "Léger (valeurs seules)"
+RENDERER_PLOTLY = "Figure Plotly complète"
+RENDERER_WEBGL = "WebGL (deck.gl)"
+RENDERERS = [RENDERER_COMPONENT, RENDERER_PLOTLY, RENDERER_WEBGL]
+
+# Mémoire maximale occupée par les cartes en cache (hors géométrie, partagée)
+FIGURE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+@st.cache_resource
 def load_geojson(filepath):
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    """Géométrie partagée par tout le processus, transmise à plotly sans copie"""
+    return read_geojson(filepath)
 
 @st.cache_data
-def load_indicator_sources():
-    """Charge les sources des indicateurs depuis le fichier CSV"""
-    try:
-        sources_df = pd.read_csv("data/columns_indicateurs.csv", sep=";")
-        # Créer un dictionnaire indicateur -> source
-        # Utiliser 'Nouveau_nom_indicateur' si disponible, sinon 'Indicateur'
-        if 'Nouveau_nom_indicateur' in sources_df.columns:
-            sources_dict = dict(zip(sources_df['Nouveau_nom_indicateur'], sources_df.get('Source', '')))
-        else:
-            sources_dict = dict(zip(sources_df['Indicateur'], sources_df.get('Source', '')))
-        return sources_dict
-    except Exception as e:
-        st.warning(f"Impossible de charger les sources des indicateurs: {e}")
-        return {}
+def load_geometry_bounds(geometry_key, _geojson):
+    """Emprise d'une géométrie, calculée une fois pour centrer la carte WebGL"""
+    return geometry_bounds(_geojson)
 
-def get_scale_options(df, column):
-    """Calcule les différentes échelles de représentation"""
-    values = df[column].dropna()
-    
-    if len(values) == 0:
+@st.cache_data
+def load_geometry_manifest():
+    """Niveaux de détail disponibles pour chaque couche"""
+    return load_manifest()
+
+@st.cache_data
+def load_epci_membership():
+    """Communes de chaque EPCI, pour le zoom sur un EPCI"""
+    return load_membership()
+
+@st.cache_resource
+def load_epci_geojson(code_epci):
+    """Géométrie fine des seules communes d'un EPCI, partagée par tout le processus"""
+    manifest = load_geometry_manifest()
+    bundle_path = select_bundle_path(manifest, code_epci)
+    if bundle_path:
+        return read_geojson(bundle_path)
+    # Pas de fichier précalculé : entités de la couche communale détaillée, sans copie
+    return subset_geojson(load_geojson(select_geometry_path('Commune', manifest, vue='zoom')),
+                          load_epci_membership()[code_epci]['communes'])
+
+def map_geometry(echelle, epci=None):
+    """Clé et GeoJSON de la carte : toute la couche de l'échelle, ou les communes d'un EPCI"""
+    if epci is not None:
+        return f"Commune:epci:{epci}", load_epci_geojson(epci)
+    geometry_path = select_geometry_path(echelle, load_geometry_manifest())
+    return f"{echelle}:{geometry_path}", load_geojson(geometry_path)
+
+def zoom_mask(cube, epci=None):
+    """Territoires du cube affichés : tous, ou les communes de l'EPCI choisi"""
+    if epci is None:
+        return np.ones(len(cube.territories), dtype=bool)
+    return np.isin(cube.territories, load_epci_membership()[epci]['communes'])
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_indicator_search(echelle, version):
+    """Index de recherche des indicateurs d'une échelle (libellé et thématique), par version du catalogue"""
+    catalogue = load_catalog()
+    indicateurs = list_indicators(catalogue, echelle)
+    return SearchIndex(indicateurs, [f"{ind} {catalogue['indicateurs'][ind].get('thematique', '')}"
+                                     for ind in indicateurs])
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_territory_search(echelle, version):
+    """Index de recherche des territoires d'une échelle (libellé et code), par version des données"""
+    cube = load_cube_version(echelle, version)
+    labels = cube.labels if cube.labels is not None else cube.territories
+    return SearchIndex(cube.territories, [f"{label} {code}" for label, code in zip(labels, cube.territories)])
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_slice_statistics(echelle, version, _df):
+    """Statistiques de toutes les tranches, calculées une fois par version des données d'une échelle"""
+    return compute_slice_statistics(_df)
+
+@st.cache_data
+def load_class_breaks(echelle, indicateur, empreinte, date_str, method, n_classes, _values):
+    """Bornes de classes d'une tranche, calculées une fois par (tranche, version de l'indicateur, méthode, classes)"""
+    return compute_breaks(_values, method, n_classes)
+
+@st.cache_resource
+def get_figure_cache():
+    """Cache LRU des cartes construites, commun à toutes les sessions du processus"""
+    return FigureCache(max_bytes=FIGURE_CACHE_MAX_BYTES)
+
+def format_stat(value):
+    return "n.d." if pd.isna(value) else f"{value:.2f}"
+
+def get_scale_options(slice_stats):
+    """Calcule les différentes échelles de représentation à partir des statistiques de la tranche"""
+    if not slice_stats or slice_stats['count'] == 0:
         return None, None, None
     
     # Option 1: Échelle linéaire (min à max)
-    linear_scale = [values.min(), values.max()]
+    linear_scale = [slice_stats['min'], slice_stats['max']]
     
     # Option 2: Échelle avec percentiles (5ème à 95ème percentile)
-    percentile_scale = [np.percentile(values, 5), np.percentile(values, 95)]
+    percentile_scale = [slice_stats['p05'], slice_stats['p95']]
     
     # Option 3: Échelle avec écart-type (moyenne ± 2 écarts-types)
-    mean_val = values.mean()
-    std_val = values.std()
-    std_scale = [max(values.min(), mean_val - 2*std_val), 
-                 min(values.max(), mean_val + 2*std_val)]
+    mean_val = slice_stats['mean']
+    std_val = slice_stats['std']
+    std_scale = [max(slice_stats['min'], mean_val - 2*std_val), 
+                 min(slice_stats['max'], mean_val + 2*std_val)]
     
     return linear_scale, percentile_scale, std_scale
 
-def show(df, epci_df):
-    # Charger les sources des indicateurs
-    indicator_sources = load_indicator_sources()
+def get_source_text(indicator_sources, indicateur):
+    """Mention de la source d'un indicateur, à ajouter au titre d'une carte"""
+    source_val = indicator_sources.get(indicateur)
+    if source_val is not None and pd.notna(source_val) and str(source_val).strip():
+        return f"<br><sub>Source : {source_val}</sub>"
+    return ""
+
+def build_choropleth(filtered_df, slice_stats, echelle, selected_indicateur, selected_date_str,
+                     scale_options, stat_scale, reverse_scale, indicator_sources, breaks=None, epci=None):
+    """Construit la carte choroplèthe d'une tranche (indicateur, date)"""
+    # Échelles statistiques lues dans la table précalculée
+    if slice_stats:
+        linear_scale, percentile_scale, std_scale = get_scale_options(slice_stats)
+        
+        # Appliquer l'échelle statistique sélectionnée
+        if stat_scale == "Échelle complète (min-max)" and linear_scale:
+            range_color = linear_scale
+            range_note = f"min={linear_scale[0]:.2f}, max={linear_scale[1]:.2f}"
+        elif stat_scale == "Percentiles (5-95%)" and percentile_scale:
+            range_color = percentile_scale
+            range_note = f"5e percentile={percentile_scale[0]:.2f}, 95e percentile={percentile_scale[1]:.2f}"
+        elif stat_scale == "Moyenne ± 2 écarts-types" and std_scale:
+            range_color = std_scale
+            range_note = f"moyenne ± 2σ: [{std_scale[0]:.2f}, {std_scale[1]:.2f}]"
+        else:
+            range_color = None
+            range_note = "Échelle automatique"
+    else:
+        range_color = None
+        range_note = "Pas de données"
+    
+    # Inverser l'échelle si demandé
+    color_scale = scale_options
+    if reverse_scale and scale_options not in ["Rainbow"]:
+        color_scale = color_scale + "_r"
+    
+    # Répartition en classes discrètes : une seule trace coloriée par indice de classe
+    plot_df = filtered_df
+    color_col = 'valeur'
+    color_continuous_scale = color_scale
+    class_labels = None
+    if breaks is not None and len(breaks) > 1:
+        n_classes = len(breaks) - 1
+        class_labels = [f"{low:.2f} – {high:.2f}" for low, high in zip(breaks[:-1], breaks[1:])]
+        values = filtered_df['valeur'].to_numpy(dtype=float)
+        plot_df = filtered_df.assign(classe=np.where(np.isnan(values), np.nan, assign_classes(values, breaks)))
+        color_col = 'classe'
+        # Échelle en paliers : une couleur pleine par classe
+        sample_points = [i / (n_classes - 1) for i in range(n_classes)] if n_classes > 1 else [1.0]
+        colors = sample_colorscale(get_colorscale(color_scale), sample_points)
+        color_continuous_scale = []
+        for i, color in enumerate(colors):
+            color_continuous_scale += [[i / n_classes, color], [(i + 1) / n_classes, color]]
+        range_color = [-0.5, n_classes - 0.5]
+        range_note = f"{stat_scale} : {n_classes} classes"
+    
+    # Récupérer le GeoJSON (communes de l'EPCI seulement en cas de zoom)
+    geojson = map_geometry(echelle, epci)[1]
+    
+    # Ajout de la source
+    source_text = get_source_text(indicator_sources, selected_indicateur)
+    code_col, label_col, echelle_text = CODE_COLUMNS[echelle], LABEL_COLUMNS[echelle], ECHELLE_TEXTS[echelle]
+    
+    # Créer la carte
+    fig = px.choropleth(
+        plot_df,
+        geojson=geojson,
+        locations=code_col,
+        featureidkey="properties.code",
+        color=color_col,
+        hover_name=label_col,
+        hover_data={'valeur': True, code_col: False, **({'classe': False} if class_labels else {})},
+        color_continuous_scale=color_continuous_scale,
+        range_color=range_color,
+        scope="europe",
+        center={"lat": 46.8, "lon": -2.3},
+        title=f"{selected_indicateur} à l'échelle {echelle_text} pour la date {selected_date_str}<br><sub>{range_note}</sub>{source_text}")
+    
+    if class_labels:
+        fig.update_coloraxes(colorbar=dict(title="valeur", tickvals=list(range(len(class_labels))),
+                                           ticktext=class_labels))
+    
+    fig.update_geos(fitbounds="locations", visible=False)
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+def build_change_frame(cube, echelle, selected_indicateur, date_a, date_b, relative):
+    """Valeurs aux deux dates et écart (absolu ou en %) des territoires renseignés aux deux dates"""
+    before = cube.map_slice(selected_indicateur, date_a)
+    after = cube.map_slice(selected_indicateur, date_b)
+    change = compute_change(before, after, relative=relative)
+    present = ~np.isnan(change)
+    return pd.DataFrame({
+        LABEL_COLUMNS[echelle]: cube.labels[present],
+        CODE_COLUMNS[echelle]: cube.territories[present],
+        'avant': before[present],
+        'apres': after[present],
+        'ecart': change[present],
+    })
+
+def build_change_map(plot_df, echelle, selected_indicateur, date_a_str, date_b_str, relative, reverse_scale,
+                     indicator_sources, epci=None):
+    """Carte de l'écart d'un indicateur entre deux dates, échelle divergente centrée sur 0"""
+    code_col, label_col, echelle_text = CODE_COLUMNS[echelle], LABEL_COLUMNS[echelle], ECHELLE_TEXTS[echelle]
+    # Échelle symétrique : 95e percentile des écarts absolus (les extrêmes saturent)
+    bound = float(np.percentile(np.abs(plot_df['ecart']), 95)) if len(plot_df) else 0.0
+    unit = " (%)" if relative else ""
+    fig = px.choropleth(
+        plot_df,
+        geojson=map_geometry(echelle, epci)[1],
+        locations=code_col,
+        featureidkey="properties.code",
+        color='ecart',
+        hover_name=label_col,
+        hover_data={'avant': ':.2f', 'apres': ':.2f', 'ecart': ':.2f', code_col: False},
+        labels={'avant': date_a_str, 'apres': date_b_str, 'ecart': f"Écart{unit}"},
+        color_continuous_scale="RdBu_r" if reverse_scale else "RdBu",
+        range_color=[-bound, bound] if bound > 0 else None,
+        color_continuous_midpoint=None if bound > 0 else 0,
+        scope="europe",
+        center={"lat": 46.8, "lon": -2.3},
+        title=f"Évolution de {selected_indicateur} à l'échelle {echelle_text} entre le {date_a_str} et le "
+              f"{date_b_str}{unit}{get_source_text(indicator_sources, selected_indicateur)}")
+    fig.update_geos(fitbounds="locations", visible=False)
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+def build_animated_map(cube, echelle, selected_indicateur, scale_options, stat_scale, reverse_scale,
+                       indicator_sources, epci=None):
+    """Carte animée sur toutes les dates d'un indicateur
+
+    Les valeurs de toutes les images sont le bloc territoires × dates du cube. La géométrie
+    n'est portée que par la trace de base : chaque image ne transmet que son vecteur de couleurs.
+    """
+    dates, values = cube.blocks[selected_indicateur]
+    present = ~np.all(np.isnan(values), axis=1) & zoom_mask(cube, epci)
+    values = values[present]
+    date_labels = [pd.Timestamp(d).strftime('%d/%m/%Y') for d in dates]
+    color_range = frames_range(values, (5, 95) if stat_scale == "Percentiles (5-95%)" else None)
+    colorscale = scale_options + "_r" if reverse_scale and scale_options not in ["Rainbow"] else scale_options
+    
+    base = go.Choropleth(
+        geojson=map_geometry(echelle, epci)[1],
+        featureidkey="properties.code",
+        locations=cube.territories[present],
+        z=values[:, 0],
+        text=cube.labels[present] if cube.labels is not None else None,
+        hovertemplate="%{text}<br>valeur=%{z:.2f}<extra></extra>",
+        colorscale=colorscale,
+        zmin=color_range[0] if color_range else None,
+        zmax=color_range[1] if color_range else None,
+        colorbar={"title": "valeur"},
+    )
+    frames = [go.Frame(data=[go.Choropleth(z=values[:, j])], traces=[0], name=label)
+              for j, label in enumerate(date_labels)]
+    
+    play_args = {"frame": {"duration": 800, "redraw": True}, "transition": {"duration": 0}, "fromcurrent": True}
+    fig = go.Figure(data=[base], frames=frames)
+    fig.update_layout(
+        title=f"{selected_indicateur} à l'échelle {ECHELLE_TEXTS[echelle]}, de {date_labels[0]} à {date_labels[-1]}"
+              f"{get_source_text(indicator_sources, selected_indicateur)}",
+        updatemenus=[{
+            "type": "buttons",
+            "direction": "left",
+            "x": 0.0, "y": 0.0, "xanchor": "left", "yanchor": "top",
+            "buttons": [
+                {"label": "▶ Lecture", "method": "animate", "args": [None, play_args]},
+                {"label": "⏸ Pause", "method": "animate",
+                 "args": [[None], {"frame": {"duration": 0, "redraw": False}, "mode": "immediate"}]},
+            ],
+        }],
+        sliders=[{
+            "x": 0.15, "y": 0.0, "len": 0.85,
+            "currentvalue": {"prefix": "Date : "},
+            "steps": [{"label": label, "method": "animate",
+                       "args": [[label], {"frame": {"duration": 0, "redraw": True}, "mode": "immediate"}]}
+                      for label in date_labels],
+        }],
+        width=1000,
+        height=1000,
+    )
+    fig.update_geos(fitbounds="locations", visible=False, scope="europe", center={"lat": 46.8, "lon": -2.3})
+    return fig
+
+def new_selection(state_key, code):
+    """Code sélectionné s'il diffère de la dernière sélection traitée (une sélection persiste entre reruns)"""
+    if code is None or code == st.session_state.get(state_key):
+        return None
+    st.session_state[state_key] = code
+    return code
+
+def display_map(fig, renderer, echelle, cube, hover_values=None, epci=None):
+    """Affiche une carte choropleth avec le rendu choisi ; retourne le territoire cliqué (None sans nouveau clic)"""
+    if renderer == RENDERER_PLOTLY:
+        event = st.plotly_chart(fig, use_container_width=True, key="carte_plotly",
+                                on_select="rerun", selection_mode="points")
+        points = event.selection.get('points') or []
+        return new_selection("carte_plotly_clic", points[0].get('location') if points else None)
+    geometry_key, geojson = map_geometry(echelle, epci)
+    labels = cube.labels if cube.labels is not None else cube.territories
+    if renderer == RENDERER_WEBGL:
+        # Rendu GPU : mêmes valeurs et même géométrie partagée, dessinées par deck.gl
+        clicked = show_webgl_map(fig, geojson, dict(zip(cube.territories, labels)),
+                                 load_geometry_bounds(geometry_key, geojson), key="carte_webgl",
+                                 hover_values=hover_values)
+        return new_selection("carte_webgl_clic", clicked)
+    return show_map_component(fig, geometry_key, geojson,
+                              dict(zip(cube.territories, labels)), key="carte_composant", hover_values=hover_values)
+
+def locate_territory(echelle):
+    """Sélectionne le territoire contenant les coordonnées saisies (rappel du champ de coordonnées)"""
+    coordinates = parse_coordinates(st.session_state.get("carte_coordonnees", ""))
+    if coordinates is None or len(coordinates) != 2:
+        st.session_state["carte_coordonnees_message"] = "Coordonnées attendues : « latitude, longitude »"
+        return
+    code = load_spatial_index(echelle).locate(*coordinates)
+    if code is None:
+        st.session_state["carte_coordonnees_message"] = "Aucun territoire à ces coordonnées"
+        return
+    cube = load_cube(echelle)
+    epci = st.session_state.get("carte_select_epci") if echelle == "Commune" else None
+    if code not in cube.territory_index or not zoom_mask(cube, epci)[cube.territory_index[code]]:
+        st.session_state["carte_coordonnees_message"] = f"Territoire {code} : hors des territoires affichés"
+        return
+    st.session_state["carte_select_territoire"] = code
+    st.session_state["carte_coordonnees_message"] = None
+
+def show():
+    # Catalogue : listes de sélection et sources des indicateurs, sans parcourir les données
+    catalogue = load_catalog()
+    indicator_sources = {ind: entry['source'] for ind, entry in catalogue['indicateurs'].items() if entry.get('source')}
     
     st.title("📊 Visualisation Cartographique des indicateurs de l'ORTB")
-    thematiques = sorted(df['thematique'].unique()) if 'thematique' in df.columns else ['Tous']
     
     col1, col2, col3, col4 = st.columns([1, 0.7, 1.5, 0.6])
     
@@ -64,6 +377,23 @@ def show(df, epci_df):
             horizontal=True,
             key="carte_radio_echelle"  # Clé unique
         )
+        # Zoom sur les communes d'un EPCI : seules leurs géométries sont envoyées et dessinées
+        membership = load_epci_membership() if echelle == "Commune" else {}
+        if membership:
+            selected_epci = st.selectbox(
+                "Zoom sur un EPCI",
+                options=[None] + sorted(membership, key=lambda code: membership[code]['nom']),
+                format_func=lambda code: "Toute la région" if code is None else membership[code]['nom'],
+                key="carte_select_epci"
+            )
+        else:
+            selected_epci = None
+    
+    if echelle not in catalogue['mailles']:
+        st.warning(f"Aucune donnée disponible à l'échelle {echelle}")
+        return
+    thematiques_indicateurs = list_thematiques(catalogue, echelle)
+    thematiques = list(thematiques_indicateurs) if thematiques_indicateurs else ['Tous']
     
     with col2:
         if len(thematiques) > 1:
@@ -77,16 +407,18 @@ def show(df, epci_df):
     
     with col3:
         # Filtrer d'abord par thématique si nécessaire
-        if selected_thematique != "Toutes" and 'thematique' in df.columns:
-            if echelle == "Commune":
-                indicateurs = df[df['thematique'] == selected_thematique]['indicateur'].unique()
-            else:
-                indicateurs = epci_df[epci_df['thematique'] == selected_thematique]['indicateur'].unique()
+        if selected_thematique != "Toutes":
+            indicateurs = thematiques_indicateurs.get(selected_thematique, [])
         else:
-            if echelle == "Commune":
-                indicateurs = df['indicateur'].unique()
-            else:
-                indicateurs = epci_df['indicateur'].unique() if epci_df is not None else []
+            indicateurs = list_indicators(catalogue, echelle)
+        
+        # Recherche approchée (accents, fautes de frappe) sur le libellé et la thématique
+        indicator_query = st.text_input("🔎 Rechercher un indicateur", key="carte_recherche_indicateur")
+        indicateurs = narrow_options(load_indicator_search(echelle, catalog_version()), indicator_query, indicateurs,
+                                     [st.session_state.get("carte_select_indicateur")])
+        if not indicateurs:
+            st.warning("Aucun indicateur ne correspond à la recherche")
+            return
         
         selected_indicateur = st.selectbox(
             "Indicateur", 
@@ -95,13 +427,7 @@ def show(df, epci_df):
         )
     
     with col4:
-        if echelle == "Commune":
-            dates_disponibles = sorted(df[df['indicateur'] == selected_indicateur]['date'].unique())
-        else:
-            if epci_df is not None:
-                dates_disponibles = sorted(epci_df[epci_df['indicateur'] == selected_indicateur]['date'].unique())
-            else:
-                dates_disponibles = sorted(df[df['indicateur'] == selected_indicateur]['date'].unique())
+        dates_disponibles = list_dates(catalogue, echelle, selected_indicateur)
         
         dates_options = [date.strftime('%d/%m/%Y') for date in dates_disponibles]
         
@@ -117,6 +443,35 @@ def show(df, epci_df):
             st.warning("Aucune date disponible pour cet indicateur")
             return
     
+    # Mode d'affichage : une date, l'écart entre deux dates ou l'animation sur toutes les dates
+    col_mode, col_reference, col_change = st.columns([1.5, 1, 1])
+    with col_mode:
+        mode = st.radio(
+            "Mode d'affichage",
+            options=[MODE_SINGLE, MODE_CHANGE, MODE_ANIMATION],
+            horizontal=True,
+            key="carte_radio_mode"
+        )
+    if mode == MODE_CHANGE:
+        if len(dates_options) < 2:
+            st.warning("Une seule date disponible pour cet indicateur : comparaison impossible")
+            return
+        with col_reference:
+            reference_date_str = st.selectbox(
+                "Date de référence",
+                options=dates_options,
+                index=0,
+                key="carte_select_date_reference"
+            )
+            reference_date = datetime.strptime(reference_date_str, '%d/%m/%Y')
+        with col_change:
+            relative_change = st.radio(
+                "Écart",
+                options=["Absolu", "En %"],
+                horizontal=True,
+                key="carte_radio_ecart"
+            ) == "En %"
+    
     # Nouvelle section pour les options d'échelle
     st.markdown("---")
     col_scale1, col_scale2, col_scale3 = st.columns(3)
@@ -137,9 +492,18 @@ def show(df, epci_df):
                 "Échelle complète (min-max)",
                 "Percentiles (5-95%)", 
                 "Moyenne ± 2 écarts-types"
-            ],
+            ] + list(CLASSIFICATION_METHODS),
             key="carte_select_stat_scale"  # Clé unique
         )
+        if stat_scale in CLASSIFICATION_METHODS:
+            n_classes = st.selectbox(
+                "Nombre de classes",
+                options=list(range(3, 10)),
+                index=2,
+                key="carte_select_n_classes"  # Clé unique
+            )
+        else:
+            n_classes = None
     
     with col_scale3:
         # Option pour inverser l'échelle de couleur
@@ -147,148 +511,147 @@ def show(df, epci_df):
             "Inverser l'échelle de couleur",
             key="carte_checkbox_reverse"  # Clé unique
         )
+        # Rendu : composant (géométrie envoyée une fois, puis valeurs seules), figure plotly complète ou WebGL
+        renderer = st.radio(
+            "Rendu de la carte",
+            options=RENDERERS,
+            key="carte_radio_rendu"
+        )
     
-    # Filtrage des données selon l'échelle
-    if echelle == "Commune":
-        filtered_df = df[
-            (df['indicateur'] == selected_indicateur) & 
-            (df['date'] == selected_date)]
-        
-        # Calcul des échelles statistiques
-        if len(filtered_df) > 0:
-            linear_scale, percentile_scale, std_scale = get_scale_options(filtered_df, 'valeur')
-            
-            # Appliquer l'échelle statistique sélectionnée
-            if stat_scale == "Échelle complète (min-max)" and linear_scale:
-                range_color = linear_scale
-                range_note = f"min={linear_scale[0]:.2f}, max={linear_scale[1]:.2f}"
-            elif stat_scale == "Percentiles (5-95%)" and percentile_scale:
-                range_color = percentile_scale
-                range_note = f"5e percentile={percentile_scale[0]:.2f}, 95e percentile={percentile_scale[1]:.2f}"
-            elif stat_scale == "Moyenne ± 2 écarts-types" and std_scale:
-                range_color = std_scale
-                range_note = f"moyenne ± 2σ: [{std_scale[0]:.2f}, {std_scale[1]:.2f}]"
-            else:
-                range_color = None
-                range_note = "Échelle automatique"
-        else:
-            range_color = None
-            range_note = "Pas de données"
-        
-        # Inverser l'échelle si demandé
-        color_scale = scale_options
-        if reverse_scale and scale_options not in ["Rainbow"]:
-            color_scale = color_scale + "_r"
-        
-        # Récupérer le GeoJSON
-        communes_geojson = load_geojson("data/communes_simple.geojson")
-        
-        # Ajout de la source
-        source_text = ""
-        if selected_indicateur in indicator_sources:
-            source_val = indicator_sources[selected_indicateur]
-            if pd.notna(source_val) and str(source_val).strip():
-                source_text = f"<br><sub>Source : {source_val}</sub>"
-        
-        # Créer la carte
-        fig = px.choropleth(
-            filtered_df,
-            geojson=communes_geojson,
-            locations='code_commune',
-            featureidkey="properties.code",
-            color='valeur',
-            hover_name='libelle_commune',
-            hover_data={'valeur': True, 'code_commune': False},
-            color_continuous_scale=color_scale,
-            range_color=range_color,
-            scope="europe",
-            center={"lat": 46.8, "lon": -2.3},
-            title=f"{selected_indicateur} à l'échelle communale pour la date {selected_date_str}<br><sub>{range_note}</sub>{source_text}")
-        
-    else:  # EPCI
-        filtered_df = epci_df[
-            (epci_df['indicateur'] == selected_indicateur) & 
-            (epci_df['date'] == selected_date)].copy()
-        
-        filtered_df['code'] = filtered_df['code_epci']
-        
-        # Calcul des échelles statistiques
-        if len(filtered_df) > 0:
-            linear_scale, percentile_scale, std_scale = get_scale_options(filtered_df, 'valeur')
-            
-            # Appliquer l'échelle statistique sélectionnée
-            if stat_scale == "Échelle complète (min-max)" and linear_scale:
-                range_color = linear_scale
-                range_note = f"min={linear_scale[0]:.2f}, max={linear_scale[1]:.2f}"
-            elif stat_scale == "Percentiles (5-95%)" and percentile_scale:
-                range_color = percentile_scale
-                range_note = f"5e percentile={percentile_scale[0]:.2f}, 95e percentile={percentile_scale[1]:.2f}"
-            elif stat_scale == "Moyenne ± 2 écarts-types" and std_scale:
-                range_color = std_scale
-                range_note = f"moyenne ± 2σ: [{std_scale[0]:.2f}, {std_scale[1]:.2f}]"
-            else:
-                range_color = None
-                range_note = "Échelle automatique"
-        else:
-            range_color = None
-            range_note = "Pas de données"
-        
-        # Inverser l'échelle si demandé
-        color_scale = scale_options
-        if reverse_scale and scale_options not in ["Rainbow"]:
-            color_scale = color_scale + "_r"
-        
-        # Récupérer le GeoJSON
-        epci_geojson = load_geojson("data/epci_simple.geojson")
-        
-        # Ajout de la source
-        source_text = ""
-        if selected_indicateur in indicator_sources:
-            source_val = indicator_sources[selected_indicateur]
-            if pd.notna(source_val) and str(source_val).strip():
-                source_text = f"<br><sub>Source : {source_val}</sub>"
-        
-        # Créer la carte
-        fig = px.choropleth(
-            filtered_df,
-            geojson=epci_geojson,
-            locations='code_epci',
-            featureidkey="properties.code",
-            color='valeur',
-            hover_name='libelle_epci',
-            hover_data={'valeur': True, 'code_epci': False},
-            color_continuous_scale=color_scale,
-            range_color=range_color,
-            scope="europe",
-            center={"lat": 46.8, "lon": -2.3},
-            title=f"{selected_indicateur} à l'échelle EPCI pour la date {selected_date_str}<br><sub>{range_note}</sub>{source_text}")
+    # Tranche (indicateur, date) lue dans le cube de l'échelle : une colonne de bloc, sans filtrer la table
+    # Versions lues une fois : données, cube et caches dérivés restent cohérents pendant une ingestion
+    version = data_version(echelle)
+    current_df = load_data_version(echelle, version)
+    cube = load_cube_version(echelle, version)
+    # Les cartes d'un indicateur restent en cache tant que sa partition ne change pas
+    empreinte = indicator_version(echelle, selected_indicateur)
+    if current_df is None or cube is None:
+        st.warning(f"Aucune donnée disponible à l'échelle {echelle}")
+        return
+    code_col, label_col = CODE_COLUMNS[echelle], LABEL_COLUMNS[echelle]
+    figure_cache = get_figure_cache()
     
-    fig.update_geos(fitbounds="locations", visible=False)
-    fig.update_layout(width=1000, height=1000)
-    st.plotly_chart(fig, use_container_width=True)
+    if mode == MODE_CHANGE:
+        # Écart calculé sur deux colonnes du bloc de l'indicateur
+        change_df = build_change_frame(cube, echelle, selected_indicateur, reference_date, selected_date,
+                                       relative_change)
+        if selected_epci is not None:
+            change_df = change_df[change_df[code_col].isin(membership[selected_epci]['communes'])]
+        fig = figure_cache.get_or_build(
+            (MODE_CHANGE, echelle, selected_indicateur, empreinte, reference_date_str, selected_date_str, relative_change,
+             reverse_scale, selected_epci),
+            lambda: build_change_map(change_df, echelle, selected_indicateur, reference_date_str, selected_date_str,
+                                     relative_change, reverse_scale, indicator_sources, epci=selected_epci))
+        display_map(fig, renderer, echelle, cube, epci=selected_epci)
+        st.subheader("Données affichées")
+        show_paginated_table(change_df, np.arange(len(change_df)), list(change_df.columns), key="carte_table_ecart")
+        return
+    
+    if mode == MODE_ANIMATION:
+        # Toutes les images en une seule figure : le navigateur anime sans rerun
+        range_mode = "Percentiles (5-95%)" if stat_scale == "Percentiles (5-95%)" else None
+        fig = figure_cache.get_or_build(
+            (MODE_ANIMATION, echelle, selected_indicateur, empreinte, scale_options, reverse_scale, range_mode, selected_epci),
+            lambda: build_animated_map(cube, echelle, selected_indicateur, scale_options, range_mode, reverse_scale,
+                                       indicator_sources, epci=selected_epci))
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption("Échelle de couleur commune à toutes les dates"
+                   + (" (5e-95e percentiles)" if range_mode else " (min-max)"))
+        return
+    
+    slice_values = cube.map_slice(selected_indicateur, selected_date)
+    # Zoom sur un EPCI : ses communes seulement, avec l'échelle et les classes de toute la région
+    present = ~np.isnan(slice_values) & zoom_mask(cube, selected_epci)
+    filtered_df = pd.DataFrame({
+        label_col: cube.labels[present],
+        code_col: cube.territories[present],
+        'valeur': slice_values[present],
+        'date': pd.Timestamp(selected_date),
+    })
+    slice_stats = get_slice_statistics(load_slice_statistics(echelle, version, current_df), selected_indicateur, selected_date)
+    
+    # Figure réutilisée entre reruns et sessions pour un même état de carte
+    figure_key = (echelle, selected_indicateur, empreinte, selected_date_str, scale_options, reverse_scale, stat_scale,
+                  n_classes, selected_epci)
+    fig = figure_cache.get_or_build(
+        figure_key,
+        lambda: build_choropleth(
+            filtered_df, slice_stats, echelle, selected_indicateur, selected_date_str,
+            scale_options, stat_scale, reverse_scale, indicator_sources,
+            breaks=load_class_breaks(echelle, selected_indicateur, empreinte, selected_date_str, stat_scale,
+                                     n_classes, slice_values) if n_classes else None,
+            epci=selected_epci))
+    clicked = display_map(fig, renderer, echelle, cube,
+                          hover_values=filtered_df.set_index(code_col)['valeur'] if n_classes else None,
+                          epci=selected_epci)
+    # Clic sur un territoire de la carte : affichage de son évolution
+    if clicked in cube.territory_index:
+        st.session_state["carte_toggle_evolution"] = True
+        st.session_state["carte_select_territoire"] = clicked
+    cache_stats = figure_cache.stats()
+    st.caption(f"Cache des cartes : {cache_stats['hits']} réutilisations, {cache_stats['misses']} constructions, "
+               f"{cache_stats['entries']} cartes en mémoire ({cache_stats['bytes'] / 1e6:.1f} Mo)")
     
     # Afficher un résumé des statistiques
-    if len(filtered_df) > 0:
+    if slice_stats:
+        # Zoom sur un EPCI : statistiques de ses seules communes ; échelle et classes restent régionales
+        if selected_epci is not None:
+            shown_stats = describe_values(filtered_df['valeur'].to_numpy())
+            scope = f"{membership[selected_epci]['nom']} ({shown_stats['count']} communes renseignées)"
+        else:
+            shown_stats = slice_stats
+            scope = "toute la région"
         # NE PAS utiliser key dans st.expander() si votre version ne le supporte pas
-        with st.expander("📈 Statistiques descriptives"):
+        with st.expander(f"📈 Statistiques descriptives — {scope}"):
             col_stat1, col_stat2, col_stat3 = st.columns(3)
             with col_stat1:
-                st.metric("Moyenne", f"{filtered_df['valeur'].mean():.2f}")
+                st.metric("Moyenne", format_stat(shown_stats['mean']))
             with col_stat2:
-                st.metric("Médiane", f"{filtered_df['valeur'].median():.2f}")
+                st.metric("Médiane", format_stat(shown_stats['median']))
             with col_stat3:
-                st.metric("Écart-type", f"{filtered_df['valeur'].std():.2f}")
+                st.metric("Écart-type", format_stat(shown_stats['std']))
+            if selected_epci is not None:
+                st.caption("L'échelle de couleur et les classes de la carte sont calculées sur toute la région.")
+    
+    # Évolution d'un territoire : une ligne du bloc de l'indicateur (graphique construit à la demande)
+    if st.toggle("📉 Évolution d'un territoire", key="carte_toggle_evolution"):
+        order = np.argsort(cube.labels.astype(str))
+        order = order[zoom_mask(cube, selected_epci)[order]]
+        territory_labels = dict(zip(cube.territories, cube.labels))
+        st.caption("Cliquez sur un territoire de la carte, choisissez-le dans la liste ou saisissez des coordonnées.")
+        col_territory, col_coordinates = st.columns([2, 1])
+        with col_coordinates:
+            st.text_input("Coordonnées (latitude, longitude)", key="carte_coordonnees",
+                          placeholder="48.1113, -1.6800", on_change=locate_territory, args=(echelle,))
+            if st.session_state.get("carte_coordonnees_message"):
+                st.caption(st.session_state["carte_coordonnees_message"])
+        with col_territory:
+            territory_query = st.text_input("🔎 Rechercher un territoire", key="carte_recherche_territoire")
+            territory_options = narrow_options(load_territory_search(echelle, version), territory_query,
+                                               list(cube.territories[order]),
+                                               [st.session_state.get("carte_select_territoire")])
+            if not territory_options:
+                # Liste trop longue et aucun territoire choisi : premiers territoires par ordre alphabétique
+                territory_options = list(cube.territories[order[:SEARCH_LIMIT]])
+            selected_territory = st.selectbox(
+                "Territoire",
+                options=territory_options,
+                format_func=lambda code: f"{territory_labels[code]} ({code})",
+                key="carte_select_territoire"
+            )
+        serie_dates, serie_values = cube.time_series(selected_territory, selected_indicateur)
+        st.line_chart(pd.DataFrame({selected_indicateur: serie_values}, index=pd.DatetimeIndex(serie_dates)))
     
     # Données sous la carte
     st.subheader("Données affichées")
-    if echelle == "Commune":
-        display_df = filtered_df[['libelle_commune', 'code_commune', 'valeur', 'date']].copy()
-    else:
-        display_df = filtered_df[['libelle_epci', 'code_epci', 'valeur', 'date']].copy()
+    # Table paginée : la date n'est mise en forme que sur les lignes de la page affichée
+    display_columns = [label_col, code_col, 'valeur', 'date']
     
-    display_df['date'] = display_df['date'].dt.strftime('%d/%m/%Y')
+    def format_dates(page_df):
+        return page_df.assign(date=page_df['date'].dt.strftime('%d/%m/%Y'))
     
-    st.dataframe(display_df, use_container_width=True, key="carte_dataframe")
+    show_paginated_table(filtered_df, np.arange(len(filtered_df)), display_columns,
+                         key="carte_table", prepare=format_dates)
 
 
 
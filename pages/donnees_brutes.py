@@ -1,57 +1,151 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from utils.chargement import (VERSIONED_CACHE_ENTRIES, data_version, load_cube, load_data_version,
+                              load_spatial_index)
+from utils.donnees import dataset_available
+from utils.export import EXCEL_MAX_ROWS, EXPORT_FORMATS, available_formats, export_bundle, export_file
+from utils.filtres import (ALL_VALUES, FILTER_PARAMS, build_filter_index, build_label_lookup, decode_filters,
+                           encode_filters, select_rows)
+from utils.pagination import show_paginated_table
+from utils.recherche import MAX_UNFILTERED_OPTIONS, SearchIndex, narrow_options
+from utils.spatial import parse_coordinates
 
-def show(df_communes, df_epci):
+# Colonnes (code, libellé) des territoires de chaque maille
+TERRITORY_COLUMNS = {
+    'Commune': ('code_commune', 'libelle_commune'),
+    'EPCI': ('code_epci', 'libelle_epci'),
+}
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_filter_index(maille, version, _df):
+    """Index de filtrage (positions des lignes par valeur) construit une fois par version des données d'une maille"""
+    code_col, label_col = TERRITORY_COLUMNS[maille]
+    index = build_filter_index(_df, [code_col, 'thematique', 'indicateur', 'date'])
+    return index, build_label_lookup(_df, index, code_col, label_col)
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_filter_options(maille, version, _df):
+    """Options triées de chaque filtre et index de recherche des territoires et indicateurs, une fois par version"""
+    filter_index, label_lookup = load_filter_index(maille, version, _df)
+    code_col, label_col = TERRITORY_COLUMNS[maille]
+    # Territoires : par libellé si disponible (recherche aussi sur leurs codes), sinon par code
+    if label_col in _df.columns:
+        territories = sorted(label_lookup)
+        territory_texts = [f"{label} {' '.join(label_lookup[label])}" for label in territories]
+    else:
+        territories = sorted(filter_index.get(code_col, {}))
+        territory_texts = territories
+    indicateurs = sorted(filter_index.get('indicateur', {}))
+    # Thématique de chaque indicateur : celle de sa première ligne
+    thematique_rows = [filter_index['indicateur'][ind][0] for ind in indicateurs]
+    indicator_texts = [f"{ind} {thematique}" for ind, thematique in
+                       zip(indicateurs, _df['thematique'].iloc[thematique_rows].astype(str))]
+    return {
+        'territoires': territories,
+        'thematiques': sorted(filter_index.get('thematique', {})),
+        'indicateurs': indicateurs,
+        'dates': [d.strftime('%Y-%m-%d') for d in sorted(filter_index.get('date', {}))],
+        'recherche_territoires': SearchIndex(territories, territory_texts),
+        'recherche_indicateurs': SearchIndex(indicateurs, indicator_texts),
+    }
+
+def seed_filter_widget(key, values, options):
+    """Initialise un filtre (case « Tout » et sélection) à partir des filtres appliqués, une seule fois"""
+    if key in st.session_state:
+        return
+    if values == ALL_VALUES:
+        st.session_state[f"{key}_tout"] = True
+        values = []
+    st.session_state[key] = [v for v in values if v in options]
+
+def filter_widget(label, options, key, available=None):
+    """Case « Tout » et sélection multiple d'un filtre ; retourne ALL_VALUES ou la liste choisie
+
+    `available` : toutes les options du filtre, quand `options` n'en propose qu'une partie.
+    """
+    if not (options if available is None else available):
+        st.info(f"Aucune option disponible : {label.lower()}")
+        return []
+    select_all = st.checkbox("Tout", key=f"{key}_tout")
+    selection = st.multiselect(label, options=options, key=key)
+    return ALL_VALUES if select_all else selection
+
+def add_search_results(key, results_key):
+    """Ajoute à la sélection d'un filtre les résultats de recherche choisis (rappel du bouton)"""
+    chosen = st.session_state.get(results_key, [])
+    st.session_state[key] = list(dict.fromkeys(st.session_state.get(key, []) + chosen))
+    st.session_state[f"{key}_tout"] = False
+    st.session_state[results_key] = []
+
+def search_widget(label, search_index, key):
+    """Recherche approchée (accents, fautes de frappe) dont les résultats choisis s'ajoutent au filtre `key`"""
+    query = st.text_input(label, key=f"{key}_recherche", placeholder="Nom ou code, même approximatif")
+    if not query.strip():
+        return
+    results_key = f"{key}_resultats"
+    results = st.multiselect("Résultats", options=search_index.search(query), key=results_key)
+    st.button("Ajouter à la sélection", key=f"{key}_ajouter", use_container_width=True, disabled=not results,
+              on_click=add_search_results, args=(key, results_key))
+
+def add_located_territories(maille, key, code_labels):
+    """Ajoute à la sélection d'un filtre les territoires d'un point ou d'une emprise (rappel du bouton)"""
+    coordinates = parse_coordinates(st.session_state.get("brutes_emplacement", ""))
+    if coordinates is None:
+        st.session_state["brutes_emplacement_message"] = ("Format attendu : « lat, lon » "
+                                                          "ou « lat min, lon min, lat max, lon max »")
+        return
+    index = load_spatial_index(maille)
+    codes = [index.locate(*coordinates)] if len(coordinates) == 2 else index.query_box(*coordinates)
+    found = list(dict.fromkeys(code_labels[code] for code in codes if code in code_labels))
+    st.session_state[key] = list(dict.fromkeys(st.session_state.get(key, []) + found))
+    st.session_state[f"{key}_tout"] = False
+    st.session_state["brutes_emplacement_message"] = f"{len(found)} territoire(s) ajouté(s) à la sélection"
+
+def show_cross_section(df, cube, rows, code_col, label_col):
+    """Tableau croisé territoires × indicateurs des lignes filtrées, à une date choisie"""
+    dates = sorted(df['date'].iloc[rows].unique())
+    selected_date = st.selectbox(
+        "Date du tableau croisé",
+        options=dates,
+        index=len(dates) - 1,
+        format_func=lambda d: d.strftime('%d/%m/%Y'),
+        key="brutes_select_date_croise"
+    )
+    indicateurs = sorted(df['indicateur'].iloc[rows].unique())
+    territory_rows = [cube.territory_index[code] for code in sorted(df[code_col].iloc[rows].unique())]
+    matrix = cube.cross_section(selected_date, indicateurs)[territory_rows]
+    cross_df = pd.DataFrame(matrix, columns=indicateurs)
+    cross_df.insert(0, code_col, cube.territories[territory_rows])
+    if cube.labels is not None:
+        cross_df.insert(0, label_col, cube.labels[territory_rows])
+    # Indicateurs sans valeur à cette date : colonnes retirées
+    cross_df = cross_df.dropna(axis=1, how='all')
+    st.dataframe(cross_df, use_container_width=True, height=400, hide_index=True)
+
+def show():
     st.title("📁 Données Brutes")
     
-    # Vérifier qu'au moins un DataFrame est fourni
-    if df_communes is None and df_epci is None:
-        st.error("Aucune donnée fournie. Veuillez fournir au moins un DataFrame (communes ou EPCI).")
+    # Mailles disponibles (fichiers présents) : seule la maille sélectionnée est chargée
+    maille_options = [maille for maille in TERRITORY_COLUMNS if dataset_available(maille)]
+    if not maille_options:
+        st.error("Aucune donnée disponible. Veuillez fournir au moins un jeu de données (communes ou EPCI).")
         return
     
-    # Préparer les DataFrames
-    if df_communes is not None and df_epci is not None:
-        # Préparer les deux DataFrames séparément
-        df_communes_prepared = df_communes.copy()
-        df_epci_prepared = df_epci.copy()
-        
-        # Ajouter colonne maille
-        if 'maille' not in df_communes_prepared.columns:
-            df_communes_prepared['maille'] = 'Commune'
-        if 'maille' not in df_epci_prepared.columns:
-            df_epci_prepared['maille'] = 'EPCI'
-            
-        # Utiliser le DataFrame correspondant à la maille sélectionnée
-        df_dict = {
-            'Commune': df_communes_prepared,
-            'EPCI': df_epci_prepared
-        }
-        
-    elif df_communes is not None:
-        df_communes_prepared = df_communes.copy()
-        if 'maille' not in df_communes_prepared.columns:
-            df_communes_prepared['maille'] = 'Commune'
-        df_dict = {'Commune': df_communes_prepared}
-        
-    else:  # seulement df_epci
-        df_epci_prepared = df_epci.copy()
-        if 'maille' not in df_epci_prepared.columns:
-            df_epci_prepared['maille'] = 'EPCI'
-        df_dict = {'EPCI': df_epci_prepared}
+    # Filtres appliqués : ils vivent dans l'URL, qu'un lien partagé suffit à reproduire
+    url_maille, applied = decode_filters({key: st.query_params.get_all(key) for key in st.query_params})
     
     # Sidebar pour les filtres
     with st.sidebar:
         st.header("🔍 Filtres")
         
         st.markdown("---")
-        st.info("ℹ️ Veuillez sélectionner vos filtres ci-dessous")
+        st.info("ℹ️ Veuillez sélectionner vos filtres ci-dessous, puis cliquer sur « Appliquer »")
         st.markdown("---")
         
-        # Options de maille disponibles
-        maille_options = list(df_dict.keys())
-        
-        # Sélection de la maille avec clé statique
+        # Sélection de la maille avec clé statique (celle de l'URL au premier affichage)
+        if "maille_territoriale_select" not in st.session_state and url_maille in maille_options:
+            st.session_state["maille_territoriale_select"] = url_maille
         maille = st.selectbox(
             "Maille territoriale",
             options=maille_options,
@@ -59,200 +153,99 @@ def show(df_communes, df_epci):
             key="maille_territoriale_select"
         )
         
-        # Récupérer le DataFrame pour cette maille
-        current_df = df_dict[maille]
+        # Les filtres appliqués ne valent que pour leur maille
+        if url_maille != maille:
+            applied = {}
+        
+        # Récupérer le DataFrame pour cette maille (partagé : ni copié ni modifié)
+        version = data_version(maille)
+        current_df = load_data_version(maille, version)
+        filter_index, label_lookup = load_filter_index(maille, version, current_df)
+        code_col, label_col = TERRITORY_COLUMNS[maille]
         
-        # Initialiser les sélections
-        codes_selection = []
-        thematiques_selection = []
-        indicateurs_selection = []
-        dates_selection = []
+        # Territoires : par libellé si disponible (converti en codes), sinon par code
+        filter_options = load_filter_options(maille, version, current_df)
+        use_labels = label_col in current_df.columns
+        territories = filter_options['territoires']
+        if use_labels:
+            code_labels = {code: label for label, codes in label_lookup.items() for code in codes}
+        else:
+            code_labels = {code: code for code in territories}
+        territory_key = {
+            ('Commune', True): "communes_select",
+            ('Commune', False): "communes_codes_select",
+            ('EPCI', True): "epci_select",
+            ('EPCI', False): "epci_codes_select",
+        }[(maille, use_labels)]
+        territory_label = {
+            ('Commune', True): "Sélectionner les communes",
+            ('Commune', False): "Sélectionner les communes (codes)",
+            ('EPCI', True): "Sélectionner les EPCI",
+            ('EPCI', False): "Sélectionner les EPCI (codes)",
+        }[(maille, use_labels)]
+        
+        thematiques = filter_options['thematiques']
+        indicateurs = filter_options['indicateurs']
+        dates_str = filter_options['dates']
+        
+        # Pré-remplir les widgets avec les filtres appliqués (lien partagé) au premier affichage
+        applied_territories = applied.get('territoires', [])
+        if applied_territories != ALL_VALUES:
+            applied_territories = list(dict.fromkeys(code_labels[c] for c in applied_territories if c in code_labels))
+        seed_filter_widget(territory_key, applied_territories, territories)
+        seed_filter_widget("thematiques_select", applied.get('thematiques', []), thematiques)
+        seed_filter_widget("indicateurs_select", applied.get('indicateurs', []), indicateurs)
+        seed_filter_widget("dates_select", applied.get('dates', []), dates_str)
         
-        # Filtrer par territoire selon la maille
-        if maille == 'Commune':
-            # Utiliser libelle_commune si disponible
-            if 'libelle_commune' in current_df.columns:
-                communes = sorted(current_df['libelle_commune'].dropna().unique().tolist())
-                if communes:
-                    selected_communes = st.multiselect(
-                        "Sélectionner les communes",
-                        options=communes,
-                        default=[],
-                        key="communes_select"
-                    )
-                    
-                    # Bouton Tout pour communes
-                    col_btn1, col_btn2 = st.columns(2)
-                    with col_btn1:
-                        if st.button("Tout", key="btn_all_communes"):
-                            selected_communes = communes
-                    with col_btn2:
-                        if st.button("Aucun", key="btn_no_communes"):
-                            selected_communes = []
-                    
-                    # Convertir noms en codes si besoin
-                    if selected_communes and 'code_commune' in current_df.columns:
-                        # Créer un mapping temporaire
-                        temp_df = current_df[['code_commune', 'libelle_commune']].drop_duplicates()
-                        mapping = dict(zip(temp_df['libelle_commune'], temp_df['code_commune']))
-                        codes_selection = [mapping.get(name) for name in selected_communes if name in mapping]
-                else:
-                    st.info("Aucune commune disponible")
-            elif 'code_commune' in current_df.columns:
-                codes = sorted(current_df['code_commune'].dropna().unique().astype(str).tolist())
-                if codes:
-                    codes_selection = st.multiselect(
-                        "Sélectionner les communes (codes)",
-                        options=codes,
-                        default=[],
-                        key="communes_codes_select"
-                    )
-                    
-                    col_btn1, col_btn2 = st.columns(2)
-                    with col_btn1:
-                        if st.button("Tout", key="btn_all_communes_codes"):
-                            codes_selection = codes
-                    with col_btn2:
-                        if st.button("Aucun", key="btn_no_communes_codes"):
-                            codes_selection = []
-                else:
-                    st.info("Aucun code de commune disponible")
-                    
-        elif maille == 'EPCI':
-            # Utiliser libelle_epci si disponible
-            if 'libelle_epci' in current_df.columns:
-                epcis = sorted(current_df['libelle_epci'].dropna().unique().tolist())
-                if epcis:
-                    selected_epcis = st.multiselect(
-                        "Sélectionner les EPCI",
-                        options=epcis,
-                        default=[],
-                        key="epci_select"
-                    )
-                    
-                    col_btn1, col_btn2 = st.columns(2)
-                    with col_btn1:
-                        if st.button("Tout", key="btn_all_epci"):
-                            selected_epcis = epcis
-                    with col_btn2:
-                        if st.button("Aucun", key="btn_no_epci"):
-                            selected_epcis = []
-                    
-                    # Convertir noms en codes si besoin
-                    if selected_epcis and 'code_epci' in current_df.columns:
-                        temp_df = current_df[['code_epci', 'libelle_epci']].drop_duplicates()
-                        mapping = dict(zip(temp_df['libelle_epci'], temp_df['code_epci']))
-                        codes_selection = [mapping.get(name) for name in selected_epcis if name in mapping]
-                else:
-                    st.info("Aucun EPCI disponible")
-            elif 'code_epci' in current_df.columns:
-                codes = sorted(current_df['code_epci'].dropna().unique().astype(str).tolist())
-                if codes:
-                    codes_selection = st.multiselect(
-                        "Sélectionner les EPCI (codes)",
-                        options=codes,
-                        default=[],
-                        key="epci_codes_select"
-                    )
-                    
-                    col_btn1, col_btn2 = st.columns(2)
-                    with col_btn1:
-                        if st.button("Tout", key="btn_all_epci_codes"):
-                            codes_selection = codes
-                    with col_btn2:
-                        if st.button("Aucun", key="btn_no_epci_codes"):
-                            codes_selection = []
-                else:
-                    st.info("Aucun code d'EPCI disponible")
+        # Recherche approchée : les résultats choisis s'ajoutent aux sélections du formulaire
+        with st.expander("🔎 Rechercher", expanded=len(territories) > MAX_UNFILTERED_OPTIONS):
+            search_widget("Territoire", filter_options['recherche_territoires'], territory_key)
+            search_widget("Indicateur ou thématique", filter_options['recherche_indicateurs'], "indicateurs_select")
         
-        # Filtrer par thématique
-        if 'thematique' in current_df.columns:
-            thematiques = sorted(current_df['thematique'].dropna().unique().tolist())
-            if thematiques:
-                thematiques_selection = st.multiselect(
-                    "Sélectionner les thématiques",
-                    options=thematiques,
-                    default=[],
-                    key="thematiques_select"
-                )
-                
-                col_btn1, col_btn2 = st.columns(2)
-                with col_btn1:
-                    if st.button("Tout", key="btn_all_thematiques"):
-                        thematiques_selection = thematiques
-                with col_btn2:
-                    if st.button("Aucun", key="btn_no_thematiques"):
-                        thematiques_selection = []
-            else:
-                st.info("Aucune thématique disponible")
+        # Territoires d'un point ou d'une emprise, trouvés par l'index spatial des géométries locales
+        with st.expander("📍 Sélection par emplacement"):
+            st.text_input("Point (lat, lon) ou emprise (lat min, lon min, lat max, lon max)",
+                          key="brutes_emplacement", placeholder="48.1113, -1.6800")
+            st.button("Ajouter à la sélection", key="btn_emplacement", use_container_width=True,
+                      on_click=add_located_territories, args=(maille, territory_key, code_labels))
+            if st.session_state.get("brutes_emplacement_message"):
+                st.caption(st.session_state["brutes_emplacement_message"])
         
-        # Filtrer par indicateur
-        if 'indicateur' in current_df.columns:
-            indicateurs = sorted(current_df['indicateur'].dropna().unique().tolist())
-            if indicateurs:
-                indicateurs_selection = st.multiselect(
-                    "Sélectionner les indicateurs",
-                    options=indicateurs,
-                    default=[],
-                    key="indicateurs_select"
-                )
-                
-                col_btn1, col_btn2 = st.columns(2)
-                with col_btn1:
-                    if st.button("Tout", key="btn_all_indicateurs"):
-                        indicateurs_selection = indicateurs
-                with col_btn2:
-                    if st.button("Aucun", key="btn_no_indicateurs"):
-                        indicateurs_selection = []
-            else:
-                st.info("Aucun indicateur disponible")
+        # Les sélections sont préparées dans un formulaire et appliquées en une seule exécution
+        with st.form("filtres_form", border=False):
+            # Liste trop longue pour être envoyée en entier : seuls les territoires déjà choisis y figurent
+            territory_options = narrow_options(None, "", territories, st.session_state.get(territory_key, []))
+            territories_selection = filter_widget(territory_label, territory_options, territory_key, territories)
+            thematiques_selection = filter_widget("Sélectionner les thématiques", thematiques, "thematiques_select")
+            indicateurs_selection = filter_widget("Sélectionner les indicateurs", indicateurs, "indicateurs_select")
+            dates_selection = filter_widget("Sélectionner les dates", dates_str, "dates_select")
+            
+            submitted = st.form_submit_button("✅ Appliquer les filtres", type="primary", use_container_width=True)
         
-        # Filtrer par date
-        if 'date' in current_df.columns:
-            dates = sorted(current_df['date'].dropna().unique())
-            if len(dates) > 0:
-                dates_str = [d.strftime('%Y-%m-%d') if hasattr(d, 'strftime') else str(d) for d in dates]
-                dates_selection = st.multiselect(
-                    "Sélectionner les dates",
-                    options=dates_str,
-                    default=[],
-                    key="dates_select"
-                )
-                
-                col_btn1, col_btn2 = st.columns(2)
-                with col_btn1:
-                    if st.button("Tout", key="btn_all_dates"):
-                        dates_selection = dates_str
-                with col_btn2:
-                    if st.button("Aucun", key="btn_no_dates"):
-                        dates_selection = []
-            else:
-                st.info("Aucune date disponible")
+        if submitted:
+            if use_labels and territories_selection != ALL_VALUES:
+                territories_selection = [code for name in territories_selection for code in label_lookup.get(name, [])]
+            applied = {
+                'territoires': territories_selection,
+                'thematiques': thematiques_selection,
+                'indicateurs': indicateurs_selection,
+                'dates': dates_selection,
+            }
+            st.query_params.from_dict({'page': 'donnees_brutes', **encode_filters(maille, applied)})
         
         st.markdown("---")
         
-        # Boutons d'action
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🧹 Tout remplir", type="primary", use_container_width=True, key="btn_fill_all"):
-                # Le rerun sera géré par les boutons individuels
-                st.info("Utilisez les boutons 'Tout' de chaque section")
-        with col2:
-            if st.button("🗑️ Réinitialiser", use_container_width=True, key="btn_reset"):
-                # Réinitialiser les sélections
-                st.session_state.clear()
-                st.rerun()
+        if st.button("🗑️ Réinitialiser", use_container_width=True, key="btn_reset"):
+            # Réinitialiser les sélections et les filtres de l'URL
+            st.session_state.clear()
+            st.query_params.clear()
+            st.rerun()
     
     # Zone principale
     main_container = st.container()
     
-    # Vérifier si des filtres sont sélectionnés
-    has_filters = (
-        (codes_selection and len(codes_selection) > 0) or
-        (thematiques_selection and len(thematiques_selection) > 0) or
-        (indicateurs_selection and len(indicateurs_selection) > 0) or
-        (dates_selection and len(dates_selection) > 0)
-    )
+    # Vérifier si des filtres sont appliqués (« Tout » compte comme un filtre)
+    has_filters = any(applied.get(name) for name in FILTER_PARAMS)
     
     with main_container:
         if not has_filters:
@@ -264,103 +257,125 @@ def show(df_communes, df_epci):
             1. **Choisissez une maille territoriale** (Commune ou EPCI)
             2. **Sélectionnez les territoires** concernés
             3. **Filtrez par thématique**, indicateur ou date selon vos besoins
-            4. Utilisez les boutons **"Tout"** pour sélectionner toutes les options d'un filtre
-            5. Utilisez les boutons **"Aucun"** pour effacer la sélection
+            4. Cochez **"Tout"** pour retenir toutes les options d'un filtre
+            5. Cliquez sur **"Appliquer les filtres"** pour afficher les données
             
-            Les données s'afficheront automatiquement une fois les filtres sélectionnés.
+            Les filtres appliqués sont conservés dans l'adresse de la page : partagez-la pour partager le résultat.
             """)
             st.markdown("---")
             return
         
-        # Appliquer les filtres
-        filtered_df = current_df.copy()
-        
-        # Filtrer par territoire
-        if codes_selection and len(codes_selection) > 0:
-            if maille == 'Commune' and 'code_commune' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['code_commune'].astype(str).isin([str(c) for c in codes_selection])]
-            elif maille == 'EPCI' and 'code_epci' in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df['code_epci'].astype(str).isin([str(c) for c in codes_selection])]
-        
-        # Filtrer par thématique
-        if thematiques_selection and len(thematiques_selection) > 0:
-            filtered_df = filtered_df[filtered_df['thematique'].isin(thematiques_selection)]
-        
-        # Filtrer par indicateur
-        if indicateurs_selection and len(indicateurs_selection) > 0:
-            filtered_df = filtered_df[filtered_df['indicateur'].isin(indicateurs_selection)]
-        
-        # Filtrer par date
-        if dates_selection and len(dates_selection) > 0:
-            filtered_df = filtered_df[filtered_df['date'].astype(str).isin(dates_selection)]
+        # Appliquer les filtres : intersection des positions de lignes indexées (« Tout » ne filtre pas)
+        selections = {
+            code_col: applied.get('territoires'),
+            'thematique': applied.get('thematiques'),
+            'indicateur': applied.get('indicateurs'),
+            'date': applied.get('dates'),
+        }
+        selections = {col: values for col, values in selections.items() if values and values != ALL_VALUES}
+        if 'date' in selections:
+            selections['date'] = [pd.Timestamp(d) for d in selections['date']]
+        rows = select_rows(filter_index, len(current_df), selections)
         
         # Afficher les résultats
-        if len(filtered_df) == 0:
+        if len(rows) == 0:
             st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
             return
         
-        st.markdown(f"**📊 {len(filtered_df)} lignes filtrées**")
-        
-        # Préparer l'affichage
-        display_df = filtered_df.copy()
+        st.markdown(f"**📊 {len(rows)} lignes filtrées**")
         
         # Réorganiser les colonnes
-        col_order = []
-        
-        # Colonnes territoriales selon la maille
-        if maille == 'Commune':
-            if 'libelle_commune' in display_df.columns:
-                col_order.append('libelle_commune')
-            if 'code_commune' in display_df.columns:
-                col_order.append('code_commune')
-        else:
-            if 'libelle_epci' in display_df.columns:
-                col_order.append('libelle_epci')
-            if 'code_epci' in display_df.columns:
-                col_order.append('code_epci')
+        col_order = [col for col in (label_col, code_col) if col in current_df.columns]
         
         # Colonnes principales
-        main_cols = ['maille', 'date', 'thematique', 'indicateur', 'valeur', 'unite']
+        main_cols = ['date', 'thematique', 'indicateur', 'valeur', 'unite']
         for col in main_cols:
-            if col in display_df.columns and col not in col_order:
+            if col in current_df.columns and col not in col_order:
                 col_order.append(col)
         
         # Autres colonnes
-        other_cols = [c for c in display_df.columns if c not in col_order]
+        other_cols = [c for c in current_df.columns if c not in col_order]
         final_order = col_order + other_cols
         
-        # Afficher le DataFrame
-        st.dataframe(
-            display_df[final_order],
-            use_container_width=True,
-            height=400
-        )
+        # La vue filtrée n'est jamais matérialisée en entier : seule la page affichée
+        # (ou le fichier exporté, au clic) est extraite à partir des positions de lignes
+        n_territory_cols = len([c for c in col_order if c in (label_col, code_col)])
+        
+        def add_maille(view):
+            view.insert(n_territory_cols, 'maille', maille)
+            return view
+        
+        def materialize(view_rows):
+            return add_maille(current_df.iloc[view_rows, [current_df.columns.get_loc(c) for c in final_order]])
         
-        # Téléchargement
-        csv = filtered_df.to_csv(index=False, encoding='utf-8-sig')
-        st.download_button(
-            label="📥 Télécharger les données (CSV)",
-            data=csv,
-            file_name=f"donnees_{maille.lower()}_filtrees.csv",
-            mime="text/csv",
-            use_container_width=True
+        presentation = st.radio(
+            "Présentation",
+            options=["Lignes", "Territoires × indicateurs"],
+            horizontal=True,
+            key="brutes_radio_presentation"
         )
         
+        if presentation == "Territoires × indicateurs":
+            # Tableau croisé à une date, lu dans le cube de la maille (territoires et indicateurs filtrés)
+            show_cross_section(current_df, load_cube(maille), rows, code_col, label_col)
+            table_rows = rows
+        else:
+            # Afficher la table paginée (tri et filtre de colonne côté serveur)
+            table_rows = show_paginated_table(current_df, rows, final_order, key="brutes_table", prepare=add_maille)
+        
+        # Téléchargement : le fichier n'est généré qu'au clic (callable), bloc par bloc
+        col_format, col_bundle = st.columns(2)
+        with col_format:
+            export_format = st.selectbox(
+                "Format d'export",
+                options=available_formats(),
+                index=0,
+                key="export_format_select"
+            )
+        with col_bundle:
+            bundle = st.checkbox(
+                "Un fichier par indicateur (archive zip)",
+                value=False,
+                key="export_bundle_checkbox"
+            )
+        
+        extension, mime = EXPORT_FORMATS[export_format]
+        file_stem = f"donnees_{maille.lower()}_filtrees"
+        if bundle:
+            st.download_button(
+                label=f"📥 Télécharger les données ({export_format}, zip)",
+                data=lambda: export_bundle(materialize(table_rows), export_format),
+                file_name=f"{file_stem}.zip",
+                mime="application/zip",
+                use_container_width=True
+            )
+        elif export_format == 'Excel' and len(table_rows) + 1 > EXCEL_MAX_ROWS:
+            st.warning("Trop de lignes pour un fichier Excel : choisissez CSV, Parquet ou l'archive par indicateur.")
+        else:
+            st.download_button(
+                label=f"📥 Télécharger les données ({export_format})",
+                data=lambda: export_file(materialize(table_rows), export_format),
+                file_name=f"{file_stem}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
+        
         # Métriques
         st.markdown("---")
         st.markdown("### 📈 Statistiques")
         
         cols = st.columns(4)
         with cols[0]:
-            st.metric("Lignes", len(filtered_df))
+            st.metric("Lignes", len(rows))
         with cols[1]:
-            st.metric("Indicateurs", filtered_df['indicateur'].nunique())
+            st.metric("Indicateurs", current_df['indicateur'].iloc[rows].nunique())
         with cols[2]:
-            st.metric("Thématiques", filtered_df['thematique'].nunique())
+            st.metric("Thématiques", current_df['thematique'].iloc[rows].nunique())
         with cols[3]:
-            if 'date' in filtered_df.columns and len(filtered_df) > 0:
-                date_min = filtered_df['date'].min()
-                date_max = filtered_df['date'].max()
+            if 'date' in current_df.columns and len(rows) > 0:
+                selected_dates = current_df['date'].iloc[rows]
+                date_min = selected_dates.min()
+                date_max = selected_dates.max()
                 min_str = date_min.strftime('%d/%m/%Y') if hasattr(date_min, 'strftime') else str(date_min)
                 max_str = date_max.strftime('%d/%m/%Y') if hasattr(date_max, 'strftime') else str(date_max)
                 st.metric("Période", f"{min_str} à {max_str}")
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from utils.agregation import aggregate_territories
+from utils.donnees import build_epci_dataset
+
+MEMBERSHIP = {
+    'E1': {'nom': 'EPCI 1', 'communes': ['C1', 'C2']},
+    'E2': {'nom': 'EPCI 2', 'communes': ['C3']},
+}
+MAPPING = pd.DataFrame({
+    'Indicateur': ['part', 'total'],
+    'Nouveau_nom_indicateur': ['Part (%)', 'Total'],
+    'Thématique': ['Mobilités', 'Mobilités'],
+    'Agrégation': ['moyenne_ponderee', 'somme'],
+    'Pondération': ['population', None],
+})
+
+
+def commune_rows():
+    """Communes sans indicateur de pondération (population) : 'Part (%)' ne peut pas être agrégé"""
+    date = pd.Timestamp('2022-01-01')
+    return pd.DataFrame({
+        'libelle_commune': ['c1', 'c2', 'c3'] * 2,
+        'code_commune': ['C1', 'C2', 'C3'] * 2,
+        'date': [date] * 6,
+        'indicateur': ['Part (%)'] * 3 + ['Total'] * 3,
+        'valeur': [10.0, 30.0, 50.0, 1.0, 2.0, 4.0],
+        'thematique': ['Mobilités'] * 6,
+    })
+
+
+def test_missing_weight_is_not_replaced_by_a_simple_mean():
+    rules = {'Part (%)': ('moyenne_ponderee', 'population'), 'Total': ('somme', None)}
+    groups = {'C1': 'E1', 'C2': 'E1', 'C3': 'E2'}
+    result, report = aggregate_territories(commune_rows(), 'code_commune', groups, rules)
+    assert report['sans_ponderation'] == ['Part (%)']
+    assert set(result['indicateur']) == {'Total'}
+    assert result.set_index('groupe')['valeur'].to_dict() == {'E1': 3.0, 'E2': 4.0}
+
+
+def test_upstream_values_kept_without_weight_and_for_epci_without_communes():
+    date = pd.Timestamp('2022-01-01')
+    upstream = pd.DataFrame({
+        'libelle_epci': ['EPCI 1', 'EPCI 2', 'EPCI 3', 'EPCI 1', 'EPCI 3'],
+        'code_epci': ['E1', 'E2', 'E3', 'E1', 'E3'],
+        'date': [date] * 5,
+        'indicateur': ['Part (%)', 'Part (%)', 'Part (%)', 'Total', 'Total'],
+        'valeur': [25.0, 45.0, 60.0, 99.0, 7.0],
+        'thematique': ['Mobilités'] * 5,
+    })
+    df, report = build_epci_dataset(commune_rows(), MAPPING, MEMBERSHIP, upstream)
+    values = {(code, ind): v for code, ind, v in
+              zip(df['code_epci'].astype(str), df['indicateur'].astype(str), df['valeur'])}
+    # Moyenne pondérée sans poids : valeurs officielles, pas de moyenne simple des communes
+    assert values[('E1', 'Part (%)')] == 25.0
+    assert values[('E2', 'Part (%)')] == 45.0
+    # Somme agrégée depuis les communes, valeur amont remplacée
+    assert values[('E1', 'Total')] == 3.0
+    # EPCI sans commune rattachée : conservé
+    assert values[('E3', 'Part (%)')] == 60.0
+    assert values[('E3', 'Total')] == 7.0
+    assert report['valeurs_amont'] == ['Part (%)']
+    assert report['epci_hors_appartenance'] == ['E3']
+    assert not np.isnan(df['valeur']).any()
+
+
+def test_missing_weight_without_upstream_values_is_dropped():
+    df, report = build_epci_dataset(commune_rows(), MAPPING, MEMBERSHIP)
+    assert report['sans_ponderation'] == ['Part (%)']
+    assert set(df['indicateur'].astype(str)) == {'Total'}
+
+
+def test_one_label_per_epci_and_no_double_counted_pseudo_epci():
+    date = pd.Timestamp('2022-01-01')
+    # 9953C3 : pseudo-EPCI de la commune C3, déjà agrégée dans E2
+    upstream = pd.DataFrame({
+        'libelle_epci': ['Communauté de communes EPCI 1', 'C3 isolée', 'Île', 'Île'],
+        'code_epci': ['E1', '9953C3', '9953C9', '9953C9'],
+        'date': [date] * 4,
+        'indicateur': ['Part (%)', 'Total', 'Total', 'Part (%)'],
+        'valeur': [25.0, 4.0, 8.0, 70.0],
+        'thematique': ['Mobilités'] * 4,
+    })
+    df, report = build_epci_dataset(commune_rows(), MAPPING, MEMBERSHIP, upstream)
+    labels = df.groupby('code_epci', observed=True)['libelle_epci'].unique()
+    assert all(len(names) == 1 for names in labels)
+    assert labels['E1'][0] == 'EPCI 1'
+    assert labels['9953C9'][0] == 'Île'
+    assert '9953C3' not in set(df['code_epci'].astype(str))
+    assert report['epci_hors_appartenance'] == ['9953C9']
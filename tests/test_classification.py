@@ -0,0 +1,47 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+from utils.classification import assign_classes, compute_breaks, jenks_breaks
+
+
+def within_class_deviation(values, classes):
+    """Somme des écarts quadratiques à la moyenne de chaque classe"""
+    return sum(((values[classes == c] - values[classes == c].mean()) ** 2).sum() for c in np.unique(classes))
+
+
+def brute_force_deviation(values, n_classes):
+    """Écart intra-classe minimal parmi tous les découpages des valeurs triées en n_classes classes"""
+    values = np.sort(values)
+    best = np.inf
+    for cuts in combinations(range(1, len(values)), n_classes - 1):
+        bounds = (0,) + cuts + (len(values),)
+        best = min(best, sum(((values[a:b] - values[a:b].mean()) ** 2).sum() for a, b in zip(bounds, bounds[1:])))
+    return best
+
+
+def test_class_of_the_minimum_alone_is_kept():
+    values = [1, 10, 12, 15, 18, 21, 23, 26, 27]
+    breaks = compute_breaks(values, 'Seuils naturels (Jenks)', 3)
+    assert list(breaks) == [1, 1, 18, 27]
+    assert list(assign_classes(np.array(values, dtype=float), breaks)) == [0, 1, 1, 1, 1, 2, 2, 2, 2]
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('n_classes', [2, 3, 4])
+def test_jenks_matches_brute_force_optimum(seed, n_classes):
+    # Valeurs distinctes : tout découpage optimal s'exprime par des bornes
+    values = np.random.default_rng(seed).choice(40, size=9, replace=False).astype(float)
+    breaks = compute_breaks(values, 'Seuils naturels (Jenks)', n_classes)
+    classes = assign_classes(values, breaks)
+    assert len(breaks) - 1 == n_classes
+    assert within_class_deviation(values, classes) == pytest.approx(brute_force_deviation(values, n_classes))
+    assert jenks_breaks(values, n_classes)[-1] == values.max()
+
+
+def test_empty_quantile_classes_are_dropped():
+    breaks = compute_breaks([1, 1, 1, 1, 3, 5], 'Quantiles', 4)
+    # Un seul quart au-dessus du minimum répété : pas de classe vide ]1, 1]
+    assert list(breaks[:2]) == [1, 1]
+    assert np.all(np.diff(breaks[1:]) > 0)
+    assert list(compute_breaks([2, 2, 2], 'Intervalles égaux', 4)) == [2, 2]
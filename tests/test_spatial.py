@@ -0,0 +1,36 @@
+import pytest
+from utils.spatial import SpatialIndex, parse_coordinates
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("48.11, -1.68", (-1.68, 48.11)),
+    ("48,11, -1,68", (-1.68, 48.11)),
+    ("48,11 -1,68", (-1.68, 48.11)),
+    ("48,11;-1,68", (-1.68, 48.11)),
+    ("48.05, -1.75, 48.15, -1.60", (-1.75, 48.05, -1.60, 48.15)),
+    ("48,05; -1,75; 48,15; -1,60", (-1.75, 48.05, -1.60, 48.15)),
+    ("47, -3, 48, -1", (-3.0, 47.0, -1.0, 48.0)),
+    ("48", None),
+    ("", None),
+])
+def test_parse_coordinates(text, expected):
+    assert parse_coordinates(text) == pytest.approx(expected) if expected else parse_coordinates(text) is None
+
+
+def test_locate_and_query_box():
+    geojson = {'features': [
+        {'properties': {'code': 'A'}, 'geometry': {'type': 'Polygon', 'coordinates': [
+            [[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]],
+            [[0.5, 0.5], [1, 0.5], [1, 1], [0.5, 1], [0.5, 0.5]],
+        ]}},
+        {'properties': {'code': 'B'}, 'geometry': {'type': 'Polygon', 'coordinates': [
+            [[2, 0], [4, 0], [4, 2], [2, 2], [2, 0]],
+        ]}},
+    ]}
+    index = SpatialIndex.from_geojson(geojson)
+    assert index.locate(1.5, 1.5) == 'A'
+    assert index.locate(0.75, 0.75) is None  # trou du polygone A
+    assert index.locate(3, 1) == 'B'
+    assert index.locate(5, 5) is None
+    assert sorted(index.query_box(1.5, 0.1, 2.5, 0.2)) == ['A', 'B']
+    assert index.query_box(3.1, 0.1, 3.2, 0.2) == ['B']
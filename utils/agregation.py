@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# Règles d'agrégation déclarées dans columns_indicateurs.csv (colonnes "Agrégation" et "Pondération")
+RULE_COLUMN = 'Agrégation'
+WEIGHT_COLUMN = 'Pondération'
+AGGREGATIONS = ['somme', 'moyenne', 'moyenne_ponderee', 'max']
+
+
+def aggregation_rules(mapping_df):
+    """Indicateur (nom affiché) -> (règle, indicateur de pondération ou None)"""
+    if mapping_df is None or RULE_COLUMN not in mapping_df.columns:
+        return {}
+    names = mapping_df['Nouveau_nom_indicateur'].fillna(mapping_df['Indicateur'])
+    # La pondération peut être désignée par le nom d'origine d'un indicateur
+    renamed = dict(zip(mapping_df['Indicateur'], names))
+    weights = mapping_df[WEIGHT_COLUMN] if WEIGHT_COLUMN in mapping_df.columns else pd.Series(None, index=names.index)
+    rules = {}
+    for name, rule, weight in zip(names, mapping_df[RULE_COLUMN], weights):
+        if pd.isna(rule) or not str(rule).strip():
+            continue
+        rule = str(rule).strip()
+        if rule not in AGGREGATIONS:
+            raise ValueError(f"Règle d'agrégation inconnue pour {name} : {rule} (attendu : {', '.join(AGGREGATIONS)})")
+        weight = renamed.get(weight.strip(), weight.strip()) if isinstance(weight, str) and weight.strip() else None
+        if rule == 'moyenne_ponderee' and weight is None:
+            raise ValueError(f"Moyenne pondérée sans indicateur de pondération pour {name}")
+        rules[name] = (rule, weight if rule == 'moyenne_ponderee' else None)
+    return rules
+
+
+def _category_lookup(series, mapping):
+    """Valeur de `mapping` pour chaque ligne d'une colonne catégorielle (None si absente ou manquante)"""
+    series = series.astype('category')
+    lookup = np.array([mapping.get(v) for v in series.cat.categories] + [None], dtype=object)
+    # Code -1 (valeur manquante) : dernier élément, None
+    return lookup[series.cat.codes.to_numpy()]
+
+
+def row_weights(df, code_col, weight_indicators):
+    """Poids de chaque ligne : valeur de l'indicateur de pondération pour le même territoire
+
+    À la même date si elle existe, sinon à la date la plus récente du territoire. NaN sans poids.
+    """
+    rows = np.flatnonzero(pd.notna(weight_indicators))
+    weights = np.full(len(df), np.nan)
+    if len(rows) == 0:
+        return weights
+    source = df.loc[df['indicateur'].isin(set(weight_indicators[rows])), ['indicateur', code_col, 'date', 'valeur']]
+    source = source.dropna(subset=['valeur']).astype({'indicateur': str, code_col: str}).sort_values('date')
+    exact = source.drop_duplicates(['indicateur', code_col, 'date'], keep='last').set_index(
+        ['indicateur', code_col, 'date'])['valeur']
+    latest = source.drop_duplicates(['indicateur', code_col], keep='last').set_index(['indicateur', code_col])['valeur']
+    codes = df[code_col].astype(str).to_numpy()[rows]
+    found = exact.reindex(pd.MultiIndex.from_arrays([weight_indicators[rows], codes, df['date'].to_numpy()[rows]]))
+    fallback = latest.reindex(pd.MultiIndex.from_arrays([weight_indicators[rows], codes]))
+    weights[rows] = np.where(np.isnan(found.to_numpy()), fallback.to_numpy(), found.to_numpy())
+    return weights
+
+
+def aggregate_territories(df, code_col, groups, rules):
+    """Agrège les valeurs des territoires par groupe (ex. communes -> EPCI) en un seul groupby
+
+    `groups` associe le code de chaque territoire à celui de son groupe, `rules` la règle de chaque
+    indicateur (voir aggregation_rules). Les indicateurs sans règle et les territoires sans groupe
+    sont écartés. Une moyenne pondérée dont l'indicateur de pondération est absent des données n'est
+    pas calculée (jamais remplacée par une moyenne simple). Retourne la table longue (groupe, date,
+    indicateur, valeur) et un rapport {'sans_regle': indicateurs sans règle, 'sans_ponderation':
+    moyennes pondérées écartées faute de poids}.
+    """
+    present = set(df['indicateur'].astype('category').cat.categories)
+    unweighted = sorted(ind for ind, (rule, weight) in rules.items()
+                        if ind in present and rule == 'moyenne_ponderee' and weight not in present)
+    rules = {ind: rule for ind, rule in rules.items() if ind not in unweighted}
+    row_rules = _category_lookup(df['indicateur'], {ind: rule for ind, (rule, _) in rules.items()})
+    row_groups = _category_lookup(df[code_col], groups)
+    keep = pd.notna(row_rules) & pd.notna(row_groups) & pd.notna(df['date'].to_numpy())
+    skipped = sorted(present - set(rules) - set(unweighted))
+
+    valeurs = df['valeur'].to_numpy(dtype=float)
+    # Poids : 1 pour la moyenne simple, indicateur de pondération pour la moyenne pondérée
+    weights = np.where(row_rules == 'moyenne', 1.0, np.nan)
+    weighted = row_rules == 'moyenne_ponderee'
+    weight_of = {ind: weight for ind, (_, weight) in rules.items()}
+    weight_indicators = np.where(weighted, _category_lookup(df['indicateur'], weight_of), None)
+    weights[weighted] = row_weights(df, code_col, weight_indicators)[weighted]
+    weights[np.isnan(valeurs)] = np.nan
+
+    work = pd.DataFrame({
+        'groupe': row_groups[keep],
+        'date': df['date'].to_numpy()[keep],
+        'indicateur': df['indicateur'].to_numpy()[keep],
+        'valeur': valeurs[keep],
+        'poids': weights[keep],
+        'produit': (valeurs * weights)[keep],
+    })
+    # Un seul passage : toutes les statistiques possibles, la règle choisit ensuite la bonne colonne
+    result = work.groupby(['groupe', 'date', 'indicateur'], sort=True).agg(
+        somme=('valeur', 'sum'),
+        max=('valeur', 'max'),
+        n=('valeur', 'count'),
+        produit=('produit', 'sum'),
+        poids=('poids', 'sum'),
+    ).reset_index()
+    rule = result['indicateur'].map(lambda ind: rules[ind][0]).to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(result['poids'] > 0, result['produit'] / result['poids'], np.nan)
+    result['valeur'] = np.select(
+        [rule == 'somme', rule == 'max'],
+        [np.where(result['n'] > 0, result['somme'], np.nan), result['max']],
+        default=mean,
+    )
+    result = result.loc[result['valeur'].notna(), ['groupe', 'date', 'indicateur', 'valeur']]
+    return result.reset_index(drop=True), {'sans_regle': skipped, 'sans_ponderation': unweighted}
@@ -0,0 +1,65 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils.geometries import SharedGeoJSON
+
+
+def estimate_size(value):
+    """Estime l'empreinte mémoire d'une structure (la géométrie partagée n'est pas comptée)"""
+    if isinstance(value, SharedGeoJSON):
+        return 0
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(item) for item in value.ravel())
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class FigureCache:
+    """Cache LRU de figures plotly, borné en mémoire et partagé entre les sessions
+
+    Les figures mises en cache ne doivent plus être modifiées : elles sont servies
+    telles quelles à toutes les sessions qui demandent la même carte.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # clé -> (figure, taille estimée)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        """Retourne la figure associée à la clé, en la construisant si besoin"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # Construction hors verrou : les autres sessions ne sont pas bloquées
+        figure = build()
+        size = estimate_size(figure.to_dict())
+
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (figure, size)
+                self._bytes += size
+                # Éviction des figures les moins récemment utilisées
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+        return figure
+
+    def stats(self):
+        """Compteurs du cache : succès, échecs, nombre de figures et mémoire estimée"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries), 'bytes': self._bytes}
@@ -0,0 +1,170 @@
+import numpy as np
+import pydeck as pdk
+import streamlit as st
+from plotly.colors import hex_to_rgb, unlabel_rgb
+from utils.composant_carte import align_to_features, feature_codes
+
+# Couleur des territoires sans valeur (RGBA)
+MISSING_COLOR = [200, 200, 200, 80]
+# Opacité du remplissage des territoires renseignés
+FILL_ALPHA = 210
+# Fond de carte sans clé d'API
+MAP_STYLE = "light"
+# Identifiant de la couche des territoires (clé des objets sélectionnés)
+LAYER_ID = "territoires"
+
+
+def colorscale_rgb(colorscale):
+    """Positions et couleurs RGB (tableau n × 3) d'une échelle de couleur plotly"""
+    positions = np.array([float(position) for position, _ in colorscale])
+    colors = np.array([
+        hex_to_rgb(color) if color.startswith('#') else unlabel_rgb(color)
+        for _, color in colorscale
+    ], dtype=float)
+    return positions, colors
+
+
+def value_colors(values, colorscale, zmin, zmax):
+    """Couleurs RGBA des valeurs, interpolées dans l'échelle entre zmin et zmax (calcul vectorisé)"""
+    positions, colors = colorscale_rgb(colorscale)
+    span = zmax - zmin if zmax > zmin else 1.0
+    scaled = np.clip((values - zmin) / span, 0.0, 1.0)
+    rgba = np.empty((len(values), 4), dtype=np.int64)
+    for channel in range(3):
+        rgba[:, channel] = np.rint(np.interp(np.nan_to_num(scaled), positions, colors[:, channel]))
+    rgba[:, 3] = FILL_ALPHA
+    rgba[np.isnan(values)] = MISSING_COLOR
+    return rgba
+
+
+def color_range(coloraxis, z):
+    """Bornes de couleur de la figure ; à défaut, celles que plotly déduit des valeurs"""
+    if coloraxis.cmin is not None and coloraxis.cmax is not None:
+        return coloraxis.cmin, coloraxis.cmax
+    if np.all(np.isnan(z)):
+        return 0.0, 1.0
+    if coloraxis.cmid is not None:
+        bound = float(np.nanmax(np.abs(z - coloraxis.cmid)))
+        return coloraxis.cmid - bound, coloraxis.cmid + bound
+    return float(np.nanmin(z)), float(np.nanmax(z))
+
+
+def geometry_bounds(geojson):
+    """Emprise (lon_min, lat_min, lon_max, lat_max) de toutes les entités"""
+    points = []
+
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            points.append(coordinates[:2])
+        elif coordinates and isinstance(coordinates[0][0], (int, float)):
+            points.extend(point[:2] for point in coordinates)
+        else:
+            for part in coordinates:
+                collect(part)
+
+    for feature in geojson['features']:
+        if feature.get('geometry'):
+            collect(feature['geometry']['coordinates'])
+    points = np.asarray(points, dtype=float)
+    return (*points.min(axis=0), *points.max(axis=0))
+
+
+def view_state(bounds):
+    """Vue initiale centrée sur l'emprise, zoom ajusté à sa plus grande dimension"""
+    lon_min, lat_min, lon_max, lat_max = bounds
+    latitude = (lat_min + lat_max) / 2
+    # Un degré de longitude rétrécit avec la latitude
+    extent = max((lon_max - lon_min) * np.cos(np.radians(latitude)), lat_max - lat_min, 1e-3)
+    zoom = float(np.clip(np.log2(360 / extent) - 0.5, 1, 14))
+    return pdk.ViewState(latitude=latitude, longitude=(lon_min + lon_max) / 2, zoom=zoom)
+
+
+def format_value(value):
+    return "n.d." if np.isnan(value) else f"{value:,.2f}".replace(",", " ")
+
+
+def legend_html(coloraxis, zmin, zmax):
+    """Légende HTML : dégradé entre les bornes, ou une case par classe quand la barre a des graduations nommées"""
+    colorbar = coloraxis.colorbar
+    title = colorbar.title.text or "valeur"
+    if colorbar.tickvals:
+        colors = value_colors(np.asarray(colorbar.tickvals, dtype=float), coloraxis.colorscale, zmin, zmax)
+        items = "".join(
+            f'<span style="display:inline-block;margin-right:12px"><span style="display:inline-block;width:14px;'
+            f'height:14px;vertical-align:middle;background:rgb({r},{g},{b})"></span> {text}</span>'
+            for (r, g, b, _), text in zip(colors.tolist(), colorbar.ticktext)
+        )
+        return f"<div><b>{title}</b> : {items}</div>"
+    positions, colors = colorscale_rgb(coloraxis.colorscale)
+    stops = ", ".join(f"rgb({r},{g},{b}) {position * 100:.1f}%"
+                      for position, (r, g, b) in zip(positions, colors.astype(int).tolist()))
+    return (f'<div><b>{title}</b> : {format_value(zmin)} '
+            f'<span style="display:inline-block;width:240px;height:12px;vertical-align:middle;'
+            f'background:linear-gradient(to right, {stops})"></span> {format_value(zmax)}</div>')
+
+
+def build_deck(fig, geojson, labels, bounds, hover_values=None):
+    """Carte WebGL (deck.gl) d'une figure choropleth plotly : mêmes valeurs, échelle et bornes
+
+    Les entités sont des copies superficielles de celles de la géométrie partagée : seules les
+    propriétés (libellé, valeur, couleur) sont propres à la carte, les coordonnées ne sont pas recopiées.
+    """
+    trace = fig.data[0]
+    coloraxis = fig.layout.coloraxis
+    codes = feature_codes(geojson)
+    feature_index = {code: i for i, code in enumerate(codes)}
+    z = align_to_features(trace.locations, trace.z, feature_index)
+    zmin, zmax = color_range(coloraxis, z)
+    colors = value_colors(z, coloraxis.colorscale, zmin, zmax).tolist()
+    shown = z
+    if hover_values is not None:
+        shown = align_to_features(hover_values.index, hover_values.to_numpy(), feature_index)
+
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': feature['geometry'],
+            'properties': {
+                'code': code,
+                'libelle': labels.get(code, code),
+                'valeur': format_value(value),
+                'couleur': color,
+            },
+        }
+        for feature, code, value, color in zip(geojson['features'], codes, shown, colors)
+    ]
+    layer = pdk.Layer(
+        "GeoJsonLayer",
+        id=LAYER_ID,
+        data={'type': 'FeatureCollection', 'features': features},
+        filled=True,
+        stroked=True,
+        pickable=True,
+        get_fill_color="properties.couleur",
+        get_line_color=[255, 255, 255],
+        line_width_min_pixels=0.3,
+    )
+    value_label = coloraxis.colorbar.title.text or "valeur"
+    return pdk.Deck(
+        layers=[layer],
+        initial_view_state=view_state(bounds),
+        map_style=MAP_STYLE,
+        tooltip={"html": f"<b>{{libelle}}</b> ({{code}})<br/>{value_label} : {{valeur}}"},
+    )
+
+
+def show_webgl_map(fig, geojson, labels, bounds, key, hover_values=None, height=1000):
+    """Affiche une carte choropleth plotly (une trace) en WebGL, avec son titre et sa légende
+
+    Retourne le code du territoire sélectionné d'un clic (None sans sélection).
+    """
+    coloraxis = fig.layout.coloraxis
+    trace = fig.data[0]
+    zmin, zmax = color_range(coloraxis, np.asarray(trace.z, dtype=float))
+    if fig.layout.title.text:
+        st.markdown(f"<div style='font-size:1.1em'>{fig.layout.title.text}</div>", unsafe_allow_html=True)
+    st.markdown(legend_html(coloraxis, zmin, zmax), unsafe_allow_html=True)
+    event = st.pydeck_chart(build_deck(fig, geojson, labels, bounds, hover_values), height=height, key=key,
+                            on_select="rerun", selection_mode="single-object")
+    objects = event.selection.get('objects', {}).get(LAYER_ID) or []
+    return objects[0]['properties']['code'] if objects else None
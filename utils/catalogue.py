@@ -0,0 +1,128 @@
+import json
+import os
+import pandas as pd
+from utils.donnees import CODE_COLUMNS, DATA_DIR, PLACEHOLDER_EPCI_CODES, PSEUDO_EPCI_PREFIX
+
+# Catalogue des jeux de données, écrit par ingestion.py et lu par les pages
+CATALOGUE_PATH = os.path.join(DATA_DIR, "catalogue.json")
+
+
+def indicator_sources(mapping_df):
+    """Source de chaque indicateur (sous son nom affiché) d'après la table de correspondance"""
+    if mapping_df is None or 'Source' not in mapping_df.columns:
+        return {}
+    name_col = 'Nouveau_nom_indicateur' if 'Nouveau_nom_indicateur' in mapping_df.columns else 'Indicateur'
+    sources = mapping_df[[name_col, 'Source']].dropna()
+    return dict(zip(sources[name_col], sources['Source'].astype(str).str.strip()))
+
+
+def describe_maille(df, maille):
+    """Résumé d'une maille : volumes, territoires et dates couvertes"""
+    date_min, date_max = df['date'].min(), df['date'].max()
+    code_col = CODE_COLUMNS[maille]
+    territoires = None
+    if code_col in df.columns:
+        codes = pd.Series(df[code_col].dropna().unique()).astype(str)
+        if maille == 'EPCI':
+            # Ni « Sans objet » ni pseudo-EPCI de commune isolée : des EPCI au sens strict
+            codes = codes[~codes.isin(PLACEHOLDER_EPCI_CODES) & ~codes.str.startswith(PSEUDO_EPCI_PREFIX)]
+        territoires = int(codes.nunique())
+    return {
+        'lignes': int(len(df)),
+        'territoires': territoires,
+        'indicateurs': int(df['indicateur'].nunique()),
+        'thematiques': int(df['thematique'].nunique()) if 'thematique' in df.columns else None,
+        'date_min': None if pd.isna(date_min) else date_min.strftime('%Y-%m-%d'),
+        'date_max': None if pd.isna(date_max) else date_max.strftime('%Y-%m-%d'),
+    }
+
+
+def describe_indicators(df):
+    """Thématique, dates, nombre de lignes et étendue des valeurs de chaque indicateur (un seul parcours groupé)"""
+    grouped = df.groupby('indicateur', observed=True, sort=True)
+    summary = grouped['valeur'].agg(['size', 'min', 'max'])
+    dates = df.groupby(['indicateur', 'date'], observed=True, sort=True).size().reset_index()
+    dates_by_ind = dates.groupby('indicateur', observed=True)['date'].agg(
+        lambda values: [d.strftime('%Y-%m-%d') for d in values]
+    )
+    if 'thematique' in df.columns:
+        themes = grouped['thematique'].first()
+    else:
+        themes = pd.Series('Non classé', index=summary.index)
+    indicators = {}
+    for ind, row in summary.iterrows():
+        indicators[ind] = {
+            'thematique': themes[ind],
+            'dates': dates_by_ind.get(ind, []),
+            'lignes': int(row['size']),
+            'min': None if pd.isna(row['min']) else float(row['min']),
+            'max': None if pd.isna(row['max']) else float(row['max']),
+        }
+    return indicators
+
+
+def build_catalogue(datasets, sources=None, previous=None):
+    """Catalogue des mailles et des indicateurs
+
+    `datasets` associe chaque maille traitée à son DataFrame ; les mailles absentes
+    gardent leur description de `previous` (catalogue précédent).
+    """
+    sources = sources or {}
+    catalogue = {'mailles': {}, 'indicateurs': {}}
+    if previous:
+        for maille, description in previous.get('mailles', {}).items():
+            if maille not in datasets:
+                catalogue['mailles'][maille] = description
+        for ind, entry in previous.get('indicateurs', {}).items():
+            kept = {m: d for m, d in entry.get('mailles', {}).items() if m not in datasets}
+            if kept:
+                catalogue['indicateurs'][ind] = dict(entry, mailles=kept)
+
+    for maille, df in datasets.items():
+        catalogue['mailles'][maille] = describe_maille(df, maille)
+        for ind, description in describe_indicators(df).items():
+            entry = catalogue['indicateurs'].setdefault(ind, {'mailles': {}})
+            entry['thematique'] = description.pop('thematique')
+            entry['mailles'][maille] = description
+
+    for ind, entry in catalogue['indicateurs'].items():
+        entry['source'] = sources.get(ind, entry.get('source'))
+    catalogue['indicateurs'] = dict(sorted(catalogue['indicateurs'].items()))
+    return catalogue
+
+
+def load_catalogue(path=CATALOGUE_PATH):
+    """Lit le catalogue (None si le fichier est absent)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_catalogue(catalogue, path=CATALOGUE_PATH):
+    """Écrit le catalogue d'un bloc : les lecteurs voient l'ancien ou le nouveau, jamais un fichier partiel"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalogue, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_thematiques(catalogue, maille):
+    """Thématique -> indicateurs disponibles pour une maille, triés"""
+    thematiques = {}
+    for ind, entry in catalogue['indicateurs'].items():
+        if maille in entry['mailles']:
+            thematiques.setdefault(entry['thematique'], []).append(ind)
+    return dict(sorted(thematiques.items()))
+
+
+def list_indicators(catalogue, maille):
+    """Indicateurs disponibles pour une maille, triés"""
+    return [ind for ind, entry in catalogue['indicateurs'].items() if maille in entry['mailles']]
+
+
+def list_dates(catalogue, maille, indicateur):
+    """Dates disponibles d'un indicateur pour une maille (Timestamp, ordre croissant)"""
+    entry = catalogue['indicateurs'].get(indicateur, {}).get('mailles', {}).get(maille)
+    return [pd.Timestamp(d) for d in entry['dates']] if entry else []
@@ -0,0 +1,104 @@
+import streamlit as st
+from utils.catalogue import build_catalogue, indicator_sources, load_catalogue
+from utils.cube import build_cube
+from utils.donnees import (CODE_COLUMNS, CSV_PATHS, LABEL_COLUMNS, dataset_available, load_dataset, load_mapping,
+                           manifest_stamp, read_maille_manifest, read_partition_manifest)
+from utils.geometries import load_manifest, read_geojson, select_geometry_path
+from utils.spatial import SpatialIndex
+
+# Une version par maille, plus l'ancienne le temps que les sessions en cours passent à la nouvelle
+VERSIONED_CACHE_ENTRIES = len(CSV_PATHS) + 1
+
+
+@st.cache_resource(max_entries=1)
+def load_partition_manifest(stamp):
+    """Manifeste des partitions, relu seulement quand le fichier change (`stamp` : date de modification)"""
+    return read_partition_manifest()
+
+
+def current_manifest():
+    """Manifeste des partitions écrit par ingestion.py (None sans partitions)"""
+    return load_partition_manifest(manifest_stamp())
+
+
+def data_version(maille):
+    """Version des données d'une maille : change à chaque ingestion qui la modifie (None sans partitions)
+
+    Les caches dérivés des données d'une maille prennent cette version en argument : une ingestion
+    ne recharge que les mailles modifiées, sans vider les autres caches.
+    """
+    manifest = current_manifest()
+    return manifest['mailles'].get(maille, {}).get('version') if manifest else None
+
+
+def indicator_version(maille, indicateur):
+    """Empreinte de la partition d'un indicateur : les cartes des indicateurs inchangés restent en cache"""
+    manifest = current_manifest()
+    if not manifest:
+        return None
+    return manifest['mailles'].get(maille, {}).get('partitions', {}).get(indicateur, {}).get('empreinte')
+
+
+def catalog_version():
+    """Version du catalogue : celle du manifeste, écrit après le catalogue"""
+    manifest = current_manifest()
+    return manifest.get('version') if manifest else None
+
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_data_version(maille, version):
+    """Données d'une maille à une version, partagées sans copie entre les sessions
+
+    Lues d'après le manifeste de cette version, pas le manifeste courant : l'entrée du cache
+    correspond toujours à sa clé, même si une ingestion a eu lieu entre-temps.
+    """
+    manifest = read_maille_manifest(maille, version) if version else None
+    if manifest is None:
+        # Sans partitions, ou version déjà supprimée (deux ingestions plus tard) : état courant
+        manifest = current_manifest()
+    return load_dataset(maille, manifest)
+
+
+def load_data(maille):
+    """Données d'une maille dans leur version courante, chargées par la première page qui en a besoin"""
+    return load_data_version(maille, data_version(maille))
+
+
+@st.cache_resource(max_entries=VERSIONED_CACHE_ENTRIES)
+def load_cube_version(maille, version):
+    """Cube territoire × indicateur × date d'une maille à une version (None sans données)"""
+    df = load_data_version(maille, version)
+    if df is None:
+        return None
+    return build_cube(df, CODE_COLUMNS[maille], LABEL_COLUMNS[maille])
+
+
+def load_cube(maille):
+    """Cube de la version courante d'une maille, construit une fois par version"""
+    return load_cube_version(maille, data_version(maille))
+
+
+@st.cache_resource
+def load_spatial_index(maille):
+    """Index spatial des territoires d'une maille, construit une fois par processus sur la géométrie détaillée"""
+    return SpatialIndex.from_geojson(read_geojson(select_geometry_path(maille, load_manifest(), vue='zoom')))
+
+
+@st.cache_resource(max_entries=2)
+def load_catalog_version(version):
+    """Catalogue écrit par ingestion.py ; à défaut, construit une fois à partir des données"""
+    catalogue = load_catalogue()
+    if catalogue is not None:
+        return catalogue
+    datasets = {}
+    for maille in CSV_PATHS:
+        if dataset_available(maille):
+            df = load_data(maille)
+            if df is not None and not df.empty:
+                datasets[maille] = df
+    return build_catalogue(datasets, indicator_sources(load_mapping()))
+
+
+def load_catalog():
+    """Catalogue de la version courante des données"""
+    return load_catalog_version(catalog_version())
@@ -0,0 +1,106 @@
+import numpy as np
+
+# Nombre maximal de points sur lesquels Jenks est calculé exactement ; au-delà,
+# les valeurs triées sont regroupées en paquets d'effectifs égaux (pondérés)
+MAX_JENKS_POINTS = 1000
+
+
+def quantile_breaks(values, n_classes):
+    """Bornes de classes d'effectifs égaux"""
+    return np.quantile(values, np.linspace(0, 1, n_classes + 1))
+
+
+def equal_interval_breaks(values, n_classes):
+    """Bornes de classes de même amplitude"""
+    return np.linspace(values.min(), values.max(), n_classes + 1)
+
+
+def _weighted_points(sorted_values):
+    """Points pondérés (moyenne, effectif, maximum) résumant les valeurs triées"""
+    uniques, counts = np.unique(sorted_values, return_counts=True)
+    if len(uniques) <= MAX_JENKS_POINTS:
+        return uniques, counts, uniques
+    # Regroupement en paquets consécutifs d'effectifs égaux
+    bounds = np.linspace(0, len(sorted_values), MAX_JENKS_POINTS + 1).astype(int)
+    counts = np.diff(bounds)
+    means = np.add.reduceat(sorted_values, bounds[:-1]) / counts
+    return means, counts, sorted_values[bounds[1:] - 1]
+
+
+def jenks_breaks(values, n_classes):
+    """Seuils naturels de Jenks (partition optimale de Fisher, programmation dynamique vectorisée)
+
+    La variance intra-classe de chaque intervalle [i, j] est obtenue par sommes cumulées,
+    puis chaque classe supplémentaire est une réduction min sur une matrice m x m :
+    O(k·m²) opérations numpy avec m ≤ MAX_JENKS_POINTS.
+    """
+    sorted_values = np.sort(values)
+    x, w, upper = _weighted_points(sorted_values)
+    m = len(x)
+    n_classes = min(n_classes, m)
+
+    # Sommes cumulées des poids, de w·x et de w·x²
+    cw = np.concatenate(([0], np.cumsum(w)))
+    cx = np.concatenate(([0], np.cumsum(w * x)))
+    cxx = np.concatenate(([0], np.cumsum(w * x * x)))
+    i = np.arange(m)[:, None]
+    j = np.arange(m)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = cw[j + 1] - cw[i]
+        sums = cx[j + 1] - cx[i]
+        cost = cxx[j + 1] - cxx[i] - sums * sums / weights
+    # cost[i, j] : variance intra-classe d'une classe couvrant les points i à j
+    cost = np.where(j >= i, np.maximum(cost, 0), np.inf)
+
+    best = cost[0].copy()
+    starts = []
+    for _ in range(1, n_classes):
+        # Nouvelle dernière classe commençant au point s ≥ 1 : best[s - 1] + cost[s, j]
+        total = best[:-1, None] + cost[1:, :]
+        start = np.argmin(total, axis=0) + 1
+        best = total[start - 1, np.arange(m)]
+        starts.append(start)
+
+    # Remontée des débuts de classes depuis le dernier point
+    breaks = [sorted_values[-1]]
+    end = m - 1
+    for start in reversed(starts):
+        s = start[end]
+        breaks.append(upper[s - 1])
+        end = s - 1
+    breaks.append(sorted_values[0])
+    return np.array(breaks[::-1])
+
+
+CLASSIFICATION_METHODS = {
+    'Quantiles': quantile_breaks,
+    'Intervalles égaux': equal_interval_breaks,
+    'Seuils naturels (Jenks)': jenks_breaks,
+}
+
+
+def drop_empty_classes(breaks):
+    """Retire les bornes répétées qui délimitent une classe vide
+
+    La première classe est fermée ([min, b1]) : min = b1 est une classe du seul minimum, conservée.
+    Les suivantes sont ouvertes à gauche (]b, b'] ) : b = b' ne contient aucune valeur.
+    """
+    kept = list(breaks[:2])
+    for bound in breaks[2:]:
+        if bound > kept[-1]:
+            kept.append(bound)
+    return np.array(kept)
+
+
+def compute_breaks(values, method, n_classes):
+    """Bornes des classes (au plus n_classes + 1 valeurs croissantes, classes vides retirées)"""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.array([])
+    return drop_empty_classes(np.sort(CLASSIFICATION_METHODS[method](values, n_classes)))
+
+
+def assign_classes(values, breaks):
+    """Indice de classe de chaque valeur (bornes supérieures incluses)"""
+    return np.clip(np.digitize(values, breaks[1:-1], right=True), 0, max(len(breaks) - 2, 0))
@@ -0,0 +1,117 @@
+import filecmp
+import os
+import numpy as np
+import plotly
+import streamlit as st
+import streamlit.components.v1 as components
+
+# Composant de carte : la géométrie d'une maille est envoyée une fois par session,
+# puis seules les valeurs (un tableau par entité) transitent à chaque changement
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "components", "carte")
+# plotly.js du paquet plotly installé, servi avec le composant : même version que les figures Python
+PLOTLY_JS_SOURCE = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+PLOTLY_JS_PATH = os.path.join(COMPONENT_DIR, "plotly.min.js")
+
+
+def sync_plotly_js(source=PLOTLY_JS_SOURCE, target=PLOTLY_JS_PATH):
+    """Copie plotly.js du paquet installé dans le dossier du composant s'il est absent ou différent"""
+    if os.path.exists(target) and filecmp.cmp(source, target, shallow=False):
+        return
+    with open(source, 'rb') as src, open(f"{target}.tmp", 'wb') as dst:
+        dst.write(src.read())
+    # Remplacement d'un bloc : un autre processus ne sert jamais un fichier partiel
+    os.replace(f"{target}.tmp", target)
+
+
+sync_plotly_js()
+_carte_valeurs = components.declare_component("carte_valeurs", path=COMPONENT_DIR)
+
+# Clés de session : géométries déjà transmises, dernière demande de renvoi et dernier clic traités
+SENT_GEOMETRIES_KEY = "carte_geometries_envoyees"
+GEOMETRY_REQUEST_KEY = "carte_geometrie_requete"
+CLICK_REQUEST_KEY = "carte_clic_requete"
+
+# Décimales conservées dans les valeurs transmises
+VALUE_DECIMALS = 6
+
+
+def feature_codes(geojson):
+    """Codes des entités de la géométrie, dans l'ordre des entités"""
+    return [feature['properties'].get('code') for feature in geojson['features']]
+
+
+def align_to_features(codes, values, feature_index):
+    """Valeurs rangées dans l'ordre des entités de la géométrie (NaN pour les entités sans valeur)"""
+    aligned = np.full(len(feature_index), np.nan)
+    positions = np.fromiter((feature_index.get(code, -1) for code in codes), dtype=np.int64, count=len(codes))
+    known = positions >= 0
+    aligned[positions[known]] = np.asarray(values, dtype=float)[known]
+    return aligned
+
+
+def to_json_values(values):
+    """Liste JSON des valeurs (null pour les valeurs manquantes, que JSON ne sait pas représenter)"""
+    rounded = np.round(values, VALUE_DECIMALS)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+def show_map_component(fig, geometry_key, geojson, labels, key, hover_values=None, height=1000):
+    """Affiche une carte plotly (une trace choropleth) via le composant, sans renvoyer la géométrie
+
+    `fig` fournit les valeurs par territoire et le style (échelle de couleur, bornes, barre de couleur, titre) ;
+    `labels` associe les codes aux libellés affichés au survol, transmis avec la géométrie ;
+    `hover_values` (Series indexée par code) remplace z au survol, ex. valeurs brutes d'une carte par classes.
+    Retourne le code du territoire cliqué depuis le dernier affichage (None sans nouveau clic).
+    """
+    sent = st.session_state.setdefault(SENT_GEOMETRIES_KEY, set())
+
+    # Le composant redemande la géométrie quand son cadre a été recréé, ou signale un clic
+    request = st.session_state.get(key)
+    clicked = None
+    if isinstance(request, dict) and 'geometrie_manquante' in request \
+            and request.get('requete') != st.session_state.get(GEOMETRY_REQUEST_KEY):
+        st.session_state[GEOMETRY_REQUEST_KEY] = request['requete']
+        sent.discard(request['geometrie_manquante'])
+    if isinstance(request, dict) and 'territoire' in request \
+            and request.get('requete') != st.session_state.get(CLICK_REQUEST_KEY):
+        st.session_state[CLICK_REQUEST_KEY] = request['requete']
+        clicked = request['territoire']
+
+    codes = feature_codes(geojson)
+    feature_index = {code: i for i, code in enumerate(codes)}
+    geometry = None
+    if geometry_key not in sent:
+        geometry = {
+            'geojson': geojson,
+            'locations': codes,
+            'labels': [labels.get(code, code) for code in codes],
+        }
+        sent.add(geometry_key)
+
+    trace = fig.data[0]
+    coloraxis = fig.layout.coloraxis
+    colorbar = coloraxis.colorbar
+    z = align_to_features(trace.locations, trace.z, feature_index)
+    hover = None
+    if hover_values is not None:
+        hover = to_json_values(align_to_features(hover_values.index, hover_values.to_numpy(), feature_index))
+
+    _carte_valeurs(
+        geometry_key=geometry_key,
+        geometry=geometry,
+        z=to_json_values(z),
+        hover_values=hover,
+        hover_label=colorbar.title.text or "valeur",
+        colorscale=[list(step) for step in coloraxis.colorscale],
+        zmin=coloraxis.cmin,
+        zmax=coloraxis.cmax,
+        colorbar={
+            'title': {'text': colorbar.title.text},
+            **({'tickvals': list(colorbar.tickvals), 'ticktext': list(colorbar.ticktext)} if colorbar.tickvals else {}),
+        },
+        title=fig.layout.title.text,
+        height=height,
+        key=key,
+        default=None,
+    )
+    return clicked
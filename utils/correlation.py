@@ -0,0 +1,40 @@
+import numpy as np
+
+# Nombre minimal de territoires renseignés pour les deux indicateurs d'une paire
+MIN_PAIRS = 3
+
+
+def pairwise_correlation(matrix, min_pairs=MIN_PAIRS):
+    """Corrélations de Pearson entre colonnes, sur les lignes renseignées pour chaque paire
+
+    Calcul vectorisé par produits matriciels sur la matrice territoires × indicateurs
+    (NaN = valeur absente). Retourne (corrélations, nombre de territoires par paire) ;
+    NaN pour les paires ayant moins de `min_pairs` territoires communs ou une variance nulle.
+    """
+    present = ~np.isnan(matrix)
+    mask = present.astype(float)
+    x = np.where(present, matrix, 0.0)
+    n = mask.T @ mask
+    # sums[i, j] : somme de l'indicateur i sur les territoires où j est renseigné
+    sums = x.T @ mask
+    squares = (x * x).T @ mask
+    products = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = products - sums * sums.T / n
+        var_x = squares - sums ** 2 / n
+        var_y = var_x.T
+        r = cov / np.sqrt(var_x * var_y)
+    r[(n < min_pairs) | ~np.isfinite(r)] = np.nan
+    # Diagonale exacte (1) pour les indicateurs non constants
+    np.fill_diagonal(r, np.where(np.isnan(np.diag(r)), np.nan, 1.0))
+    return np.clip(r, -1.0, 1.0), n.astype(int)
+
+
+def strongest_pairs(r, n, labels, limit=10):
+    """Paires d'indicateurs les plus corrélées (en valeur absolue), triées"""
+    i, j = np.triu_indices_from(r, k=1)
+    values = r[i, j]
+    keep = ~np.isnan(values)
+    i, j, values = i[keep], j[keep], values[keep]
+    order = np.argsort(-np.abs(values))[:limit]
+    return [(labels[i[k]], labels[j[k]], float(values[k]), int(n[i[k], j[k]])) for k in order]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+
+class Cube:
+    """Valeurs d'une maille rangées en cube territoire × indicateur × date
+
+    Le cube est creux par blocs : chaque indicateur a sa propre matrice territoires × dates
+    (ses dates seulement), valeurs manquantes à NaN. Les requêtes renvoient des vues sur ces
+    matrices, sans copie ni parcours de la table longue.
+    """
+
+    def __init__(self, territories, labels, blocks):
+        # Axe territoire commun à tous les blocs
+        self.territories = territories
+        self.labels = labels
+        self.territory_index = {code: i for i, code in enumerate(territories)}
+        # indicateur -> (dates, matrice territoires × dates) et index des dates de chaque bloc
+        self.blocks = blocks
+        self.date_index = {
+            ind: {pd.Timestamp(d): j for j, d in enumerate(dates)} for ind, (dates, _) in blocks.items()
+        }
+
+    @property
+    def indicators(self):
+        return list(self.blocks)
+
+    def dates(self, indicateur):
+        """Dates disponibles d'un indicateur (datetime64, ordre croissant)"""
+        return self.blocks[indicateur][0]
+
+    def map_slice(self, indicateur, date):
+        """Valeurs de tous les territoires pour (indicateur, date) : vue sur une colonne du bloc"""
+        values = self.blocks[indicateur][1]
+        return values[:, self.date_index[indicateur][pd.Timestamp(date)]]
+
+    def time_series(self, code, indicateur):
+        """Série temporelle d'un territoire pour un indicateur : (dates, vue sur une ligne du bloc)"""
+        dates, values = self.blocks[indicateur]
+        return dates, values[self.territory_index[code]]
+
+    def cross_section(self, date, indicateurs=None):
+        """Matrice territoires × indicateurs à une date (NaN si l'indicateur n'existe pas à cette date)"""
+        indicateurs = self.indicators if indicateurs is None else list(indicateurs)
+        date = pd.Timestamp(date)
+        matrix = np.full((len(self.territories), len(indicateurs)), np.nan)
+        for k, ind in enumerate(indicateurs):
+            j = self.date_index.get(ind, {}).get(date)
+            if j is not None:
+                matrix[:, k] = self.blocks[ind][1][:, j]
+        return matrix
+
+
+def build_cube(df, code_col, label_col=None):
+    """Construit le cube d'une maille à partir de la table longue (code, date, indicateur, valeur)"""
+    territory_codes, territories = pd.factorize(df[code_col], sort=True)
+    territories = np.asarray(territories, dtype=object)
+    labels = None
+    if label_col is not None and label_col in df.columns:
+        # Libellé de la première ligne de chaque territoire
+        first_rows = np.unique(territory_codes, return_index=True)[1]
+        first_rows = first_rows[territory_codes[first_rows] >= 0]
+        labels = np.empty(len(territories), dtype=object)
+        labels[territory_codes[first_rows]] = df[label_col].to_numpy()[first_rows]
+
+    date_values = df['date'].to_numpy()
+    valeurs = df['valeur'].to_numpy(dtype=float)
+    # Lignes sans territoire ni date valides : hors du cube
+    valid = (territory_codes >= 0) & ~pd.isna(date_values)
+    blocks = {}
+    for ind, positions in sorted(df.groupby('indicateur', observed=True).indices.items()):
+        positions = positions[valid[positions]]
+        dates, date_codes = np.unique(date_values[positions], return_inverse=True)
+        values = np.full((len(territories), len(dates)), np.nan)
+        values[territory_codes[positions], date_codes] = valeurs[positions]
+        blocks[ind] = (dates, values)
+    return Cube(territories, labels, blocks)
@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.agregation import aggregate_territories, aggregation_rules
+from utils.geometries import MEMBERSHIP_PATH, load_membership
+from utils.recherche import normalize
+
+# Fichiers sources (CSV) et instantanés colonnes (Parquet) par maille
+DATA_DIR = "data"
+MAPPING_PATH = os.path.join(DATA_DIR, "columns_indicateurs.csv")
+CSV_PATHS = {
+    'Commune': os.path.join(DATA_DIR, "final_df_communes.csv"),
+    'EPCI': os.path.join(DATA_DIR, "final_df_epci.csv"),
+}
+SNAPSHOT_PATHS = {
+    'Commune': os.path.join(DATA_DIR, "final_df_communes.parquet"),
+    'EPCI': os.path.join(DATA_DIR, "final_df_epci.parquet"),
+}
+# Partitions Parquet par indicateur écrites par ingestion.py, décrites par un manifeste
+PARTITION_DIR = os.path.join(DATA_DIR, "partitions")
+PARTITION_MANIFEST_PATH = os.path.join(PARTITION_DIR, "manifest.json")
+CODE_COLUMNS = {'Commune': 'code_commune', 'EPCI': 'code_epci'}
+LABEL_COLUMNS = {'Commune': 'libelle_commune', 'EPCI': 'libelle_epci'}
+# Code EPCI « Sans objet » des sources, qui ne désigne aucun territoire
+PLACEHOLDER_EPCI_CODES = {'ZZZZZZZZZ'}
+# Pseudo-EPCI des communes isolées : '99' + code région + code commune (ex. 995322016, Île-de-Bréhat)
+PSEUDO_EPCI_PREFIX = '99'
+
+# Colonnes catégorielles (peu de valeurs distinctes, répétées sur chaque ligne) :
+# stockées en dictionnaire dans l'instantané et en category en mémoire
+CATEGORY_COLUMNS = ['indicateur', 'thematique'] + list(CODE_COLUMNS.values()) + list(LABEL_COLUMNS.values())
+
+
+def load_mapping():
+    """Charge la table de correspondance des indicateurs (None si absente)"""
+    try:
+        return pd.read_csv(MAPPING_PATH, sep=";")
+    except (FileNotFoundError, pd.errors.ParserError):
+        return None
+
+
+def map_categories(values, mapping, default=None):
+    """Applique un dictionnaire sur les modalités d'une colonne (une fois par valeur distincte)
+
+    Les valeurs absentes du dictionnaire prennent `default`, ou gardent leur valeur si default est None.
+    """
+    values = values.astype('category')
+    categories = values.cat.categories
+    mapped = pd.Categorical([mapping.get(v, v if default is None else default) for v in categories])
+    # Les codes -1 (valeurs manquantes) restent manquants
+    return pd.Series(mapped.take(values.cat.codes.to_numpy(), allow_fill=True), index=values.index)
+
+
+def add_thematique_column(df, mapping_df):
+    """Ajoute la thématique et renomme les indicateurs selon la table de correspondance"""
+    if df is None:
+        return None
+
+    if mapping_df is None:
+        # Pas de correspondance : on garde les noms d'origine
+        df['thematique'] = pd.Categorical(['Non classé'] * len(df))
+        df['indicateur'] = df['indicateur'].astype('category')
+        return df
+
+    # Créer un dictionnaire à partir des deux colonnes
+    thematiques = dict(zip(mapping_df['Indicateur'], mapping_df['Thématique']))
+    nouveau_nom = dict(zip(mapping_df['Indicateur'], mapping_df['Nouveau_nom_indicateur']))
+
+    # Appliquer le mapping, 'Non classé' pour les indicateurs non référencés
+    df['thematique'] = map_categories(df['indicateur'], thematiques, default='Non classé')
+
+    # Renommer les indicateurs (les indicateurs non référencés gardent leur nom)
+    df['indicateur'] = map_categories(df['indicateur'], nouveau_nom)
+
+    return df
+
+
+def compact_dataset(df):
+    """Convertit les colonnes répétitives en category pour réduire l'empreinte mémoire"""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def read_csv_dataset(maille, mapping_df=None):
+    """Lit et prépare le CSV d'une maille (None si le fichier est absent)"""
+    code_col = CODE_COLUMNS[maille]
+    try:
+        # Codes lus en texte pour conserver les zéros initiaux
+        df = pd.read_csv(CSV_PATHS[maille], dtype={code_col: str})
+    except FileNotFoundError:
+        return None
+
+    if maille == 'EPCI':
+        df.rename(columns={'nom': 'libelle_epci'}, inplace=True)
+        # Lignes « Sans objet » : aucun territoire
+        df = df[~df[code_col].isin(PLACEHOLDER_EPCI_CODES)]
+
+    # Conversion des dates en format datetime
+    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y', errors='coerce')
+    if maille == 'Commune':
+        # Suppression des lignes avec dates invalides
+        df = df.dropna(subset=['date'])
+
+    return compact_dataset(add_thematique_column(df, mapping_df))
+
+
+def aggregated_pseudo_epci(codes, membership):
+    """Pseudo-EPCI des sources dont la commune est déjà agrégée dans un EPCI de la table d'appartenance
+
+    Conserver leurs lignes compterait deux fois les valeurs de la commune.
+    """
+    communes = {commune for entry in membership.values() for commune in entry['communes']}
+    return {code for code in codes if code.startswith(PSEUDO_EPCI_PREFIX) and code[4:] in communes}
+
+
+def keep_upstream_rows(upstream_df, membership, aggregated=()):
+    """Lignes EPCI amont que l'agrégation ne remplace pas
+
+    Indicateurs non agrégés (sans règle, ou moyenne pondérée sans poids) et EPCI absents de la
+    table d'appartenance (aucune commune rattachée) : leurs valeurs officielles sont conservées,
+    sauf pseudo-EPCI de communes déjà agrégées.
+    """
+    codes = upstream_df['code_epci'].astype(str)
+    not_aggregated = ~upstream_df['indicateur'].astype(str).isin(set(aggregated))
+    outside = ~codes.isin(set(membership))
+    ignored = codes.isin(aggregated_pseudo_epci(set(codes), membership))
+    return upstream_df[((not_aggregated | outside) & ~ignored).to_numpy()]
+
+
+def harmonize_epci_labels(df, membership):
+    """Un seul libellé par EPCI : le nom de la table d'appartenance, sinon celui des sources"""
+    names = {code_epci: entry['nom'] for code_epci, entry in membership.items()}
+    labels = df['code_epci'].astype(str).map(names)
+    df['libelle_epci'] = labels.fillna(df['libelle_epci'].astype(object)).to_numpy()
+    return df
+
+
+def build_epci_dataset(commune_df, mapping_df, membership=None, upstream_df=None):
+    """Table EPCI agrégée à partir des communes, selon les règles de la table de correspondance
+
+    `upstream_df` (table EPCI des sources, facultative) complète l'agrégation : voir keep_upstream_rows.
+    Retourne (table, rapport d'agrégation), ou (None, None) sans communes, sans table d'appartenance
+    ou sans aucune règle déclarée. Le rapport ajoute 'valeurs_amont' (indicateurs repris des sources
+    EPCI) et 'epci_hors_appartenance' (EPCI des sources conservés sans commune rattachée).
+    """
+    membership = load_membership() if membership is None else membership
+    rules = aggregation_rules(mapping_df)
+    if commune_df is None or not membership or not rules:
+        return None, None
+    groups = {commune: code_epci for code_epci, entry in membership.items() for commune in entry['communes']}
+    aggregated, report = aggregate_territories(commune_df, CODE_COLUMNS['Commune'], groups, rules)
+    thematiques = dict(zip(commune_df['indicateur'].astype(str), commune_df['thematique'].astype(str)))
+    df = pd.DataFrame({
+        'libelle_epci': None,
+        'code_epci': aggregated['groupe'],
+        'date': aggregated['date'],
+        'indicateur': aggregated['indicateur'],
+        'valeur': aggregated['valeur'],
+        'thematique': aggregated['indicateur'].map(thematiques),
+    })
+    report['valeurs_amont'], report['epci_hors_appartenance'] = [], []
+    if upstream_df is not None and not upstream_df.empty:
+        kept = keep_upstream_rows(upstream_df, membership, set(df['indicateur'].astype(str)))
+        report['valeurs_amont'] = sorted(set(kept['indicateur'].astype(str)) - set(df['indicateur'].astype(str)))
+        report['epci_hors_appartenance'] = sorted(set(kept['code_epci'].astype(str)) - set(membership))
+        df = pd.concat([df.astype({col: object for col in CATEGORY_COLUMNS if col in df.columns}),
+                        kept.astype({col: object for col in CATEGORY_COLUMNS if col in kept.columns})],
+                       ignore_index=True)
+    df = harmonize_epci_labels(df, membership)
+    return compact_dataset(df), report
+
+
+def read_epci_dataset(mapping_df=None, commune_df=None):
+    """Table EPCI : agrégée depuis les communes et complétée par le CSV EPCI historique, sinon ce CSV seul
+
+    None sans l'un ni l'autre.
+    """
+    if commune_df is None and (os.path.exists(SNAPSHOT_PATHS['Commune']) or os.path.exists(CSV_PATHS['Commune'])):
+        commune_df = load_dataset('Commune')
+    upstream_df = read_csv_dataset('EPCI', mapping_df)
+    if upstream_df is not None:
+        upstream_df = upstream_df.dropna(subset=['date'])
+    df, _ = build_epci_dataset(commune_df, mapping_df, upstream_df=upstream_df)
+    if df is None and upstream_df is not None:
+        df = compact_dataset(harmonize_epci_labels(upstream_df, load_membership()))
+    return df
+
+
+def write_snapshot(df, path):
+    """Écrit un instantané Parquet typé (dates, colonnes catégorielles en dictionnaire)"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if field.name == 'date':
+            field = field.with_type(pa.timestamp('ms'))
+        elif field.name in CATEGORY_COLUMNS:
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    table = table.cast(pa.schema(fields))
+    pq.write_table(table, path)
+
+
+def read_snapshot(path):
+    """Lit un instantané Parquet (les colonnes dictionnaire deviennent catégorielles)"""
+    return pq.read_table(path).to_pandas()
+
+
+def partition_file(maille, indicateur, empreinte):
+    """Chemin relatif (au dossier des partitions) de la partition d'un indicateur pour une empreinte donnée
+
+    L'empreinte fait partie du nom : une partition reconstruite ne remplace pas le fichier
+    qu'un processus lit peut-être encore.
+    """
+    slug = normalize(indicateur).replace(' ', '_')[:60]
+    suffix = hashlib.sha1(str(indicateur).encode('utf-8')).hexdigest()[:6]
+    return f"{maille}/{slug}-{suffix}-{empreinte[:12]}.parquet"
+
+
+def manifest_stamp(path=PARTITION_MANIFEST_PATH):
+    """Date de modification du manifeste (None s'il est absent), pour ne le relire que lorsqu'il change"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_partition_manifest(path=PARTITION_MANIFEST_PATH):
+    """Lit le manifeste des partitions (None s'il est absent)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def maille_manifest_path(maille, version):
+    """Manifeste d'une version d'une maille, conservé tant que cette version peut encore être lue"""
+    return os.path.join(PARTITION_DIR, maille, f"manifest-{version}.json")
+
+
+def read_maille_manifest(maille, version):
+    """Manifeste (réduit à la maille) d'une version donnée ; None si cette version a été supprimée"""
+    try:
+        with open(maille_manifest_path(maille, version), encoding='utf-8') as f:
+            return {'mailles': {maille: json.load(f)}}
+    except FileNotFoundError:
+        return None
+
+
+def write_partition_manifest(manifest, path=PARTITION_MANIFEST_PATH):
+    """Écrit le manifeste d'un bloc : les lecteurs voient l'ancien ou le nouveau, jamais un fichier partiel"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_partitions(maille, manifest, indicateurs=None):
+    """Concatène les partitions d'une maille (ou de certains indicateurs) listées dans le manifeste
+
+    Les indicateurs sans aucune ligne valide (entrée sans fichier) sont ignorés. None si la maille
+    n'a aucune partition.
+    """
+    entries = manifest.get('mailles', {}).get(maille, {}).get('partitions', {})
+    partitions = {name: entry for name, entry in entries.items() if entry.get('fichier')}
+    names = sorted(partitions) if indicateurs is None else sorted(set(indicateurs) & set(partitions))
+    if not names:
+        return None
+    tables = [pq.read_table(os.path.join(PARTITION_DIR, partitions[ind]['fichier'])) for ind in names]
+    # Les dictionnaires des colonnes catégorielles sont unifiés à la conversion
+    return pa.concat_tables(tables).to_pandas()
+
+
+def load_dataset(maille, manifest=None):
+    """Charge les données d'une maille : partitions du manifeste, sinon instantané Parquet, sinon CSV"""
+    manifest = read_partition_manifest() if manifest is None else manifest
+    if manifest is not None and maille in manifest.get('mailles', {}):
+        df = read_partitions(maille, manifest)
+        return None if df is None else compact_dataset(df)
+    snapshot_path = SNAPSHOT_PATHS[maille]
+    if os.path.exists(snapshot_path):
+        return compact_dataset(read_snapshot(snapshot_path))
+    if maille == 'EPCI':
+        return read_epci_dataset(load_mapping())
+    return read_csv_dataset(maille, load_mapping())
+
+
+def dataset_available(maille):
+    """Indique si des données existent pour une maille, sans les charger"""
+    if maille == 'EPCI' and dataset_available('Commune') and os.path.exists(MEMBERSHIP_PATH):
+        return True
+    manifest = read_partition_manifest()
+    partitions = (manifest or {}).get('mailles', {}).get(maille, {}).get('partitions', {})
+    if any(entry.get('fichier') for entry in partitions.values()):
+        return True
+    return os.path.exists(SNAPSHOT_PATHS[maille]) or os.path.exists(CSV_PATHS[maille])
+
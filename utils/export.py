@@ -0,0 +1,118 @@
+import io
+import re
+import unicodedata
+import zipfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Nombre de lignes sérialisées à la fois : la mémoire de travail reste bornée à un bloc
+EXPORT_CHUNK_ROWS = 50_000
+
+# Limite de lignes d'une feuille Excel (en-tête compris)
+EXCEL_MAX_ROWS = 1_048_576
+
+# Format -> (extension, type MIME)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def excel_available():
+    """Indique si le moteur Excel (openpyxl, optionnel) est installé"""
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def available_formats():
+    """Formats d'export proposés dans cet environnement"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'Excel' or excel_available()]
+
+
+def iter_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Découpe un DataFrame en blocs de lignes consécutives (vues, sans copie)"""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(df, stream, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Écrit un CSV UTF-8 (avec BOM, pour Excel) bloc par bloc dans un flux binaire"""
+    stream.write('\ufeff'.encode('utf-8'))
+    header = True
+    for chunk in iter_chunks(df, chunk_rows):
+        stream.write(chunk.to_csv(index=False, header=header).encode('utf-8'))
+        header = False
+    if header:
+        # DataFrame vide : seulement l'en-tête
+        stream.write(df.to_csv(index=False).encode('utf-8'))
+
+
+def write_parquet(df, stream, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Écrit un fichier Parquet avec un groupe de lignes par bloc"""
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(stream, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_excel(df, stream, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Écrit un classeur Excel (une feuille) bloc par bloc ; nécessite openpyxl"""
+    if len(df) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"Trop de lignes pour une feuille Excel ({len(df)} > {EXCEL_MAX_ROWS - 1})")
+    with pd.ExcelWriter(stream, engine='openpyxl') as writer:
+        df.iloc[:0].to_excel(writer, index=False, sheet_name='donnees')
+        for start in range(0, len(df), chunk_rows):
+            df.iloc[start:start + chunk_rows].to_excel(
+                writer, index=False, header=False, sheet_name='donnees', startrow=start + 1
+            )
+
+
+WRITERS = {
+    'CSV': write_csv,
+    'Parquet': write_parquet,
+    'Excel': write_excel,
+}
+
+
+def export_file(df, fmt):
+    """Contenu d'un fichier d'export au format demandé"""
+    buffer = io.BytesIO()
+    WRITERS[fmt](df, buffer)
+    return buffer.getvalue()
+
+
+def slugify(text):
+    """Nom de fichier sûr à partir d'un libellé (sans accents ni ponctuation)"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_').lower() or 'indicateur'
+
+
+def export_bundle(df, fmt, group_col='indicateur'):
+    """Archive zip contenant un fichier par indicateur, au format demandé
+
+    Chaque fichier est écrit directement dans l'archive : seul un indicateur est sérialisé à la fois.
+    """
+    extension = EXPORT_FORMATS[fmt][0]
+    buffer = io.BytesIO()
+    used_names = set()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for value, part in df.groupby(group_col, observed=True, sort=True):
+            name = slugify(value)
+            # Deux libellés distincts peuvent donner le même nom de fichier
+            suffix = 1
+            while name in used_names:
+                suffix += 1
+                name = f"{slugify(value)}_{suffix}"
+            used_names.add(name)
+            if fmt == 'Excel':
+                # openpyxl a besoin d'un flux positionnable : le classeur est construit à part
+                archive.writestr(f"{name}.{extension}", export_file(part, fmt))
+            else:
+                with archive.open(f"{name}.{extension}", 'w') as member:
+                    WRITERS[fmt](part, member)
+    return buffer.getvalue()
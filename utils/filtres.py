@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+def build_filter_index(df, columns):
+    """Positions des lignes portant chaque valeur, pour chaque colonne filtrable
+
+    Retourne un dictionnaire colonne -> {valeur: tableau trié des positions}.
+    """
+    index = {}
+    for col in columns:
+        if col not in df.columns:
+            continue
+        codes, uniques = pd.factorize(df[col])
+        # Tri stable des lignes par valeur : chaque valeur occupe une plage contiguë
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        index[col] = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+    return index
+
+
+def build_label_lookup(df, index, code_col, label_col):
+    """Correspondance libellé -> codes des territoires (plusieurs codes pour les homonymes)"""
+    if code_col not in index or label_col not in df.columns:
+        return {}
+    codes = list(index[code_col])
+    first_rows = [positions[0] for positions in index[code_col].values()]
+    labels = df[label_col].iloc[first_rows].to_numpy()
+    lookup = {}
+    for label, code in zip(labels, codes):
+        if pd.notna(label):
+            lookup.setdefault(label, []).append(code)
+    return lookup
+
+
+def select_rows(index, n_rows, selections):
+    """Positions des lignes satisfaisant toutes les sélections (colonne -> valeurs retenues)
+
+    Chaque sélection est convertie en masque booléen (union des positions de ses valeurs),
+    puis les masques sont intersectés ; une sélection vide ne filtre pas.
+    """
+    mask = None
+    for col, values in selections.items():
+        if not values:
+            continue
+        col_mask = np.zeros(n_rows, dtype=bool)
+        for value in values:
+            positions = index[col].get(value)
+            if positions is not None:
+                col_mask[positions] = True
+        mask = col_mask if mask is None else mask & col_mask
+    if mask is None:
+        return np.arange(n_rows)
+    return np.flatnonzero(mask)
+
+
+# Paramètres d'URL des filtres appliqués (dimension -> colonne filtrée)
+FILTER_PARAMS = {
+    'territoires': None,  # colonne de code de la maille
+    'thematiques': 'thematique',
+    'indicateurs': 'indicateur',
+    'dates': 'date',
+}
+# Valeur d'un paramètre signifiant « toutes les valeurs » (case « Tout » cochée)
+ALL_VALUES = '*'
+
+
+def encode_filters(maille, filters):
+    """Paramètres d'URL décrivant les filtres appliqués (listes pour les clés répétées)"""
+    params = {'maille': maille}
+    for name in FILTER_PARAMS:
+        values = filters.get(name)
+        if values == ALL_VALUES:
+            params[name] = [ALL_VALUES]
+        elif values:
+            params[name] = [str(v) for v in values]
+    return params
+
+
+def decode_filters(params):
+    """Maille et filtres appliqués lus dans les paramètres d'URL
+
+    `params` associe chaque clé à la liste de ses valeurs ; ALL_VALUES remplace la liste
+    lorsque toutes les valeurs d'une dimension sont retenues.
+    """
+    maille = next(iter(params.get('maille', [])), None)
+    filters = {}
+    for name in FILTER_PARAMS:
+        values = params.get(name, [])
+        if ALL_VALUES in values:
+            filters[name] = ALL_VALUES
+        elif values:
+            filters[name] = list(values)
+    return maille, filters
@@ -0,0 +1,126 @@
+import csv
+import json
+import os
+from utils.topojson import decode_arcs, decode_geometry
+
+
+class SharedGeoJSON(dict):
+    """GeoJSON chargé une fois par processus et partagé en lecture seule entre les sessions
+
+    copy/deepcopy renvoient l'objet lui-même : plotly (création des traces, to_dict) et
+    st.plotly_chart ne recopient plus la géométrie à chaque figure. Les méthodes de
+    modification de premier niveau lèvent une erreur ; le contenu (features, coordonnées)
+    ne doit pas non plus être modifié.
+    """
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (SharedGeoJSON, (dict(self),))
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Géométrie partagée en lecture seule")
+
+    __setitem__ = __delitem__ = _read_only
+    update = pop = popitem = clear = setdefault = _read_only
+
+
+def topology_to_geojson(topology, codes=None):
+    """Développe une topologie en GeoJSON (toutes les features, ou seulement celles des codes demandés)"""
+    arcs = decode_arcs(topology)
+    features = []
+    for layer in topology['objects'].values():
+        for geometry in layer['geometries']:
+            properties = geometry.get('properties', {})
+            if codes is not None and properties.get('code') not in codes:
+                continue
+            features.append({'type': 'Feature', 'properties': properties,
+                             'geometry': decode_geometry(geometry, arcs)})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def subset_geojson(geojson, codes):
+    """GeoJSON réduit aux entités des codes demandés ; les entités sont partagées, pas recopiées"""
+    codes = set(codes)
+    features = [feature for feature in geojson['features'] if feature['properties'].get('code') in codes]
+    return SharedGeoJSON({'type': 'FeatureCollection', 'features': features})
+
+
+def read_geojson(filepath):
+    """Lit un fichier GeoJSON ou TopoJSON et le fige pour un partage sans copie"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('type') == 'Topology':
+        # Les arcs ne sont développés qu'au chargement, une fois par processus
+        data = topology_to_geojson(data)
+    return SharedGeoJSON(data)
+
+
+# Géométries multi-résolution produites par "Simplification GeoJson.py"
+GEOMETRY_DIR = os.path.join("data", "geometries")
+MANIFEST_PATH = os.path.join(GEOMETRY_DIR, "manifest.json")
+LAYERS = {'Commune': 'communes', 'EPCI': 'epci'}
+# Niveaux de détail : tolérance de simplification en degrés
+LEVELS = {'fin': 0.0002, 'moyen': 0.0008, 'grossier': 0.003}
+# Tolérance maximale acceptable selon la vue (≈ taille d'un pixel à l'affichage)
+VIEW_TOLERANCES = {'region': 0.003, 'zoom': 0.0002}
+# Appartenance des communes aux EPCI et géométries des communes de chaque EPCI (vue zoomée)
+MEMBERSHIP_PATH = os.path.join("data", "appartenance_communes_epci.csv")
+BUNDLES_KEY = 'communes_par_epci'
+BUNDLE_DIR = os.path.join(GEOMETRY_DIR, "communes_par_epci")
+# Fichiers simplifiés historiques, utilisés tant que le manifeste n'a pas été généré
+LEGACY_PATHS = {
+    'Commune': os.path.join("data", "communes_simple.geojson"),
+    'EPCI': os.path.join("data", "epci_simple.geojson"),
+}
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Charge le manifeste des niveaux de détail ({} s'il n'existe pas)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _level_path(info):
+    # La version TopoJSON, plus compacte, est préférée quand elle a été générée
+    return info.get('topojson', info['path'])
+
+
+def select_geometry_path(maille, manifest, vue='region'):
+    """Retourne le fichier du niveau le plus grossier suffisant pour la vue"""
+    levels = manifest.get(LAYERS[maille], {})
+    if not levels:
+        return LEGACY_PATHS[maille]
+    max_tolerance = VIEW_TOLERANCES[vue]
+    suitable = [info for info in levels.values() if info['tolerance'] <= max_tolerance]
+    if suitable:
+        return _level_path(max(suitable, key=lambda info: info['tolerance']))
+    # Aucun niveau assez fin : on prend le plus détaillé disponible
+    return _level_path(min(levels.values(), key=lambda info: info['tolerance']))
+
+
+def load_membership(path=MEMBERSHIP_PATH):
+    """EPCI -> {'nom', 'communes'} d'après la table d'appartenance ({} si elle n'a pas été générée)"""
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    except FileNotFoundError:
+        return {}
+    membership = {}
+    for row in rows:
+        entry = membership.setdefault(row['code_epci'], {'nom': row['nom_epci'], 'communes': []})
+        entry['communes'].append(row['code_commune'])
+    return membership
+
+
+def select_bundle_path(manifest, code_epci):
+    """Fichier précalculé des communes d'un EPCI (None s'il n'a pas été généré)"""
+    info = manifest.get(BUNDLES_KEY, {}).get(code_epci)
+    return info['topojson'] if info else None
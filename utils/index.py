@@ -0,0 +1,6 @@
+PARTITION_COLUMNS = ['indicateur', 'date']
+
+
+def sort_for_partitions(df):
+    """Trie les lignes par (indicateur, date) avant l'écriture des partitions (lignes groupées à la lecture)"""
+    return df.sort_values(PARTITION_COLUMNS, kind='stable', ignore_index=True)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Tailles de page proposées : seule la page affichée est envoyée au navigateur
+PAGE_SIZES = [50, 100, 250, 500]
+
+NO_SORT = "(ordre d'origine)"
+NO_FILTER = "(aucun)"
+
+
+def filter_rows(df, rows, column, text):
+    """Positions de `rows` dont la colonne contient `text` (sans tenir compte de la casse)
+
+    Les colonnes catégorielles sont filtrées sur leurs modalités puis sur les codes,
+    sans convertir chaque ligne en texte.
+    """
+    if not text:
+        return rows
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        matches = series.cat.categories.astype(str).str.contains(text, case=False, regex=False)
+        keep = np.append(np.asarray(matches, dtype=bool), False)  # code -1 (valeur manquante) exclu
+        return rows[keep[series.cat.codes.to_numpy()[rows]]]
+    values = series.iloc[rows]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = values.dt.strftime('%d/%m/%Y')
+    mask = values.astype(str).str.contains(text, case=False, regex=False).to_numpy(dtype=bool)
+    return rows[mask]
+
+
+def sort_rows(df, rows, column, ascending=True):
+    """Positions de `rows` réordonnées selon une colonne (tri stable, valeurs manquantes en fin)"""
+    values = df[column].iloc[rows].reset_index(drop=True)
+    order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    return rows[order]
+
+
+def page_bounds(n_rows, page, page_size):
+    """Bornes [début, fin) de la page demandée (numérotée à partir de 1)"""
+    start = (page - 1) * page_size
+    return start, min(start + page_size, n_rows)
+
+
+def show_paginated_table(df, rows, columns, key, prepare=None, height=400):
+    """Table paginée : tri, filtre de colonne et découpage faits côté serveur sur les positions
+
+    Seules les lignes de la page courante sont matérialisées (et `prepare` appliqué dessus)
+    puis transmises à st.dataframe.
+    """
+    col_sort, col_order, col_filter, col_text = st.columns([3, 2, 3, 3])
+    with col_sort:
+        sort_column = st.selectbox("Trier par", options=[NO_SORT] + columns, key=f"{key}_tri")
+    with col_order:
+        descending = st.toggle("Décroissant", value=False, key=f"{key}_decroissant")
+    with col_filter:
+        filter_column = st.selectbox("Filtrer la colonne", options=[NO_FILTER] + columns, key=f"{key}_colonne")
+    with col_text:
+        filter_text = st.text_input("Contient", value="", key=f"{key}_texte",
+                                    disabled=filter_column == NO_FILTER)
+
+    if filter_column != NO_FILTER:
+        rows = filter_rows(df, rows, filter_column, filter_text.strip())
+    if sort_column != NO_SORT:
+        rows = sort_rows(df, rows, sort_column, ascending=not descending)
+
+    n_rows = len(rows)
+    col_size, col_page, col_info = st.columns([2, 2, 5])
+    with col_size:
+        page_size = st.selectbox("Lignes par page", options=PAGE_SIZES, index=1, key=f"{key}_taille")
+    n_pages = max(1, -(-n_rows // page_size))
+    # Revenir à une page existante si le filtre ou la taille de page a réduit le nombre de pages
+    page_key = f"{key}_page"
+    if st.session_state.setdefault(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key=page_key)
+
+    start, stop = page_bounds(n_rows, page, page_size)
+    page_df = df.iloc[rows[start:stop], [df.columns.get_loc(c) for c in columns]]
+    if prepare is not None:
+        page_df = prepare(page_df)
+    with col_info:
+        st.caption(f"Page {page} sur {n_pages} — lignes {start + 1 if n_rows else 0}–{stop} sur {n_rows}")
+
+    st.dataframe(page_df, use_container_width=True, height=height, hide_index=True, key=f"{key}_dataframe")
+    return rows
@@ -0,0 +1,96 @@
+import re
+import unicodedata
+import numpy as np
+
+# Nombre de correspondances proposées par une recherche
+SEARCH_LIMIT = 50
+# Au-delà, une liste de choix n'est proposée en entier qu'après une recherche
+MAX_UNFILTERED_OPTIONS = 2000
+# Similarité minimale (part de trigrammes communs) d'une correspondance approchée
+MIN_SIMILARITY = 0.2
+
+
+def normalize(text):
+    """Texte sans accents ni ponctuation, en minuscules, mots séparés par une espace"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def trigrams(text, prefix=False):
+    """Trigrammes des mots d'un texte normalisé (mots bordés d'espaces, comme pg_trgm)
+
+    Avec `prefix`, le dernier mot peut être incomplet (saisie en cours) : sa fin n'est pas marquée.
+    """
+    grams = set()
+    words = text.split()
+    for k, word in enumerate(words):
+        padded = f"  {word}" if prefix and k == len(words) - 1 else f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """Index de recherche approchée par trigrammes, insensible aux accents et à la casse
+
+    Chaque entrée associe une valeur (option d'une liste de choix) à un texte recherché
+    (libellé, code, thématique...). Les listes de trigrammes sont des tableaux numpy : une
+    recherche compte les trigrammes communs de toutes les entrées en un seul bincount.
+    """
+
+    def __init__(self, values, texts):
+        self.values = list(values)
+        self.texts = [normalize(text) for text in texts]
+        postings = {}
+        sizes = np.zeros(len(self.texts), dtype=np.int64)
+        for i, text in enumerate(self.texts):
+            grams = trigrams(text)
+            sizes[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.asarray(entries, dtype=np.int64) for gram, entries in postings.items()}
+        self.sizes = sizes
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Valeurs des meilleures correspondances, de la plus proche à la plus lointaine
+
+        Score : similarité de Jaccard des trigrammes, majorée quand le texte contient la requête
+        telle quelle (préfixe d'abord) pour que les saisies exactes passent avant les approchées.
+        """
+        query = normalize(query)
+        grams = trigrams(query, prefix=True)
+        if not grams or not self.values:
+            return []
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.values))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(grams) + self.sizes[candidates] - shared[candidates])
+        # Contenir la requête suppose d'en avoir tous les trigrammes : seules ces entrées sont vérifiées
+        bonus = np.zeros(len(candidates))
+        for k in np.flatnonzero(shared[candidates] == len(grams)):
+            text = self.texts[candidates[k]]
+            bonus[k] = 2.0 if text.startswith(query) else 1.0 if query in text else 0.0
+        score = similarity + bonus
+        keep = (similarity >= MIN_SIMILARITY) | (bonus > 0)
+        candidates, score = candidates[keep], score[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-score, limit)[:limit]
+            candidates, score = candidates[top], score[top]
+        order = np.lexsort((candidates, -score))
+        return [self.values[i] for i in candidates[order]]
+
+
+def narrow_options(index, query, options, selected=(), limit=SEARCH_LIMIT):
+    """Options d'une liste de choix : correspondances de la recherche, plus les valeurs déjà choisies
+
+    Sans recherche, toutes les options (ou seulement les valeurs choisies si la liste est trop longue) ;
+    `index` n'est alors pas consulté.
+    """
+    allowed = set(options)
+    selected = [value for value in selected if value in allowed]
+    if not query or not query.strip():
+        return list(options) if len(options) <= MAX_UNFILTERED_OPTIONS else selected
+    # L'index peut couvrir plus de valeurs que la liste (ex. indicateurs d'une autre thématique)
+    matches = [value for value in index.search(query, limit) if value in allowed]
+    return list(dict.fromkeys(matches + selected))
@@ -0,0 +1,177 @@
+import re
+import numpy as np
+
+# Nombre d'entrées par nœud de l'arbre
+NODE_CAPACITY = 16
+
+
+def str_order(boxes, capacity=NODE_CAPACITY):
+    """Ordre Sort-Tile-Recursive : tranches verticales par centre x, triées par centre y dans chaque tranche"""
+    n = len(boxes)
+    n_slices = int(np.ceil(np.sqrt(np.ceil(n / capacity))))
+    slice_size = n_slices * capacity
+    center_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    center_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    by_x = np.argsort(center_x, kind='stable')
+    return np.concatenate([
+        part[np.argsort(center_y[part], kind='stable')]
+        for part in (by_x[start:start + slice_size] for start in range(0, n, slice_size))
+    ]) if n else by_x
+
+
+def group_bounds(boxes, starts):
+    """Emprise de chaque groupe d'emprises consécutives commençant aux positions `starts`"""
+    return np.column_stack([
+        np.minimum.reduceat(boxes[:, 0], starts),
+        np.minimum.reduceat(boxes[:, 1], starts),
+        np.maximum.reduceat(boxes[:, 2], starts),
+        np.maximum.reduceat(boxes[:, 3], starts),
+    ])
+
+
+def expand_ranges(starts, ends):
+    """Concaténation des intervalles [début, fin) sans boucle Python"""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+def boxes_intersect(boxes, box):
+    """Emprises (n × 4 : x min, y min, x max, y max) qui touchent l'emprise `box`"""
+    return ((boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) &
+            (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1]))
+
+
+def segments_cross_box(edges, box):
+    """Segments (n × 4 : x1, y1, x2, y2) qui traversent ou touchent l'emprise (découpage de Liang-Barsky)"""
+    x1, y1 = edges[:, 0], edges[:, 1]
+    dx, dy = edges[:, 2] - x1, edges[:, 3] - y1
+    t_in = np.zeros(len(edges))
+    t_out = np.ones(len(edges))
+    outside = np.zeros(len(edges), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x1 - box[0]), (dx, box[2] - x1), (-dy, y1 - box[1]), (dy, box[3] - y1)):
+            ratio = q / p
+            outside |= (p == 0) & (q < 0)
+            t_in = np.where(p < 0, np.maximum(t_in, ratio), t_in)
+            t_out = np.where(p > 0, np.minimum(t_out, ratio), t_out)
+    return ~outside & (t_in <= t_out)
+
+
+class SpatialIndex:
+    """Index spatial d'une couche de polygones : R-tree des emprises et tests exacts vectorisés
+
+    L'arbre est empaqueté (Sort-Tile-Recursive) en tableaux numpy, niveau par niveau. Les arêtes
+    de toutes les entités sont rangées bout à bout : les tests exacts (point dans polygone, polygone
+    touchant une emprise) ne portent que sur les arêtes des candidats retenus par l'arbre.
+    Coordonnées en (longitude, latitude).
+    """
+
+    def __init__(self, codes, boxes, edges, edge_offsets, capacity=NODE_CAPACITY):
+        self.codes = np.asarray(codes, dtype=object)
+        self.boxes = boxes
+        self.edges = edges
+        self.edge_offsets = edge_offsets
+        # Feuilles : entités dans l'ordre STR ; chaque nœud couvre un intervalle du niveau inférieur
+        self.entries = str_order(boxes, capacity)
+        starts = np.arange(0, len(boxes), capacity)
+        self.levels = [(group_bounds(boxes[self.entries], starts), starts, np.minimum(starts + capacity, len(boxes)))]
+        while len(self.levels[-1][0]) > 1:
+            order = str_order(self.levels[-1][0], capacity)
+            self.levels[-1] = tuple(array[order] for array in self.levels[-1])
+            starts = np.arange(0, len(order), capacity)
+            self.levels.append((group_bounds(self.levels[-1][0], starts), starts,
+                                np.minimum(starts + capacity, len(order))))
+
+    @classmethod
+    def from_geojson(cls, geojson, capacity=NODE_CAPACITY):
+        """Construit l'index des entités surfaciques d'un GeoJSON (propriété 'code')"""
+        codes, boxes, edges, counts = [], [], [], []
+        for feature in geojson['features']:
+            geometry = feature.get('geometry')
+            if not geometry or geometry['type'] not in ('Polygon', 'MultiPolygon'):
+                continue
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            rings = [np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon if len(ring) > 1]
+            if not rings:
+                continue
+            points = np.concatenate(rings)
+            codes.append(feature['properties'].get('code'))
+            boxes.append((*points.min(axis=0), *points.max(axis=0)))
+            feature_edges = np.concatenate([np.hstack([ring[:-1], ring[1:]]) for ring in rings])
+            edges.append(feature_edges)
+            counts.append(len(feature_edges))
+        edge_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(codes, np.asarray(boxes, dtype=float).reshape(-1, 4),
+                   np.concatenate(edges) if edges else np.empty((0, 4)), edge_offsets, capacity)
+
+    def candidates(self, box):
+        """Entités dont l'emprise touche `box` (parcours de l'arbre, un niveau à la fois)"""
+        if not len(self.boxes):
+            return np.empty(0, dtype=np.int64)
+        nodes = np.arange(len(self.levels[-1][0]))
+        for bounds, starts, ends in reversed(self.levels):
+            hit = nodes[boxes_intersect(bounds[nodes], box)]
+            nodes = expand_ranges(starts[hit], ends[hit])
+        features = self.entries[nodes]
+        return features[boxes_intersect(self.boxes[features], box)]
+
+    def _edges_of(self, features):
+        """Arêtes des entités et, pour chaque arête, sa position dans `features`"""
+        starts, ends = self.edge_offsets[features], self.edge_offsets[features + 1]
+        owners = np.repeat(np.arange(len(features)), ends - starts)
+        return self.edges[expand_ranges(starts, ends)], owners
+
+    def _contains(self, features, x, y):
+        """Entités (parmi `features`) contenant le point, par la règle pair-impair (trous compris)"""
+        edges, owners = self._edges_of(features)
+        x1, y1, x2, y2 = edges.T
+        straddle = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = straddle & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+        counts = np.bincount(owners, weights=crossing, minlength=len(features))
+        return features[counts % 2 == 1]
+
+    def locate(self, lon, lat):
+        """Code de l'entité contenant le point (None hors de la couche)"""
+        inside = self._contains(self.candidates((lon, lat, lon, lat)), lon, lat)
+        return self.codes[inside[0]] if len(inside) else None
+
+    def query_box(self, lon_min, lat_min, lon_max, lat_max):
+        """Codes des entités qui touchent l'emprise (test exact sur les contours)"""
+        box = (min(lon_min, lon_max), min(lat_min, lat_max), max(lon_min, lon_max), max(lat_min, lat_max))
+        features = self.candidates(box)
+        if not len(features):
+            return []
+        edges, owners = self._edges_of(features)
+        crossed = np.bincount(owners, weights=segments_cross_box(edges, box), minlength=len(features)) > 0
+        # Emprise entièrement à l'intérieur d'une entité : aucun contour ne la traverse
+        around = np.isin(features, self._contains(features[~crossed], box[0], box[1]))
+        return list(self.codes[features[crossed | around]])
+
+
+def parse_coordinates(text):
+    """Nombres d'un texte « lat, lon » ou « lat min, lon min, lat max, lon max » (None si mal formé)
+
+    Retourne (lon, lat) pour un point, (lon min, lat min, lon max, lat max) pour une emprise.
+    Virgule décimale acceptée avec des nombres séparés par « ; », ou sans séparateur « ; » quand
+    elle donne exactement deux nombres (« 48,11, -1,68 ») ; sinon la virgule sépare les nombres.
+    """
+    text = text or ''
+    if ';' in text:
+        numbers = [float(n.replace(',', '.')) for n in re.findall(r'-?\d+(?:[.,]\d+)?', text)]
+    else:
+        numbers = [float(n) for n in re.findall(r'-?\d+(?:\.\d+)?', text)]
+        decimal_comma = re.findall(r'-?\d+(?:,\d+)?', text)
+        if '.' not in text and len(decimal_comma) == 2:
+            numbers = [float(n.replace(',', '.')) for n in decimal_comma]
+    if len(numbers) == 2:
+        lat, lon = numbers
+        return lon, lat
+    if len(numbers) == 4:
+        lat_min, lon_min, lat_max, lon_max = numbers
+        return lon_min, lat_min, lon_max, lat_max
+    return None
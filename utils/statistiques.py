@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+QUANTILES = {'p05': 0.05, 'p95': 0.95}
+
+
+def compute_slice_statistics(df):
+    """Statistiques de chaque tranche (indicateur, date), calculées en une passe groupby
+
+    Retourne un dictionnaire (indicateur, date) -> {min, max, mean, std, median, count, p05, p95}.
+    """
+    if df is None or df.empty:
+        return {}
+    grouped = df.groupby(['indicateur', 'date'], observed=True, sort=False)['valeur']
+    stats = grouped.agg(['min', 'max', 'mean', 'std', 'median', 'count'])
+    # Mêmes percentiles que np.percentile (interpolation linéaire)
+    quantiles = grouped.quantile(list(QUANTILES.values())).unstack()
+    for name, q in QUANTILES.items():
+        stats[name] = quantiles[q]
+    return {(indicateur, pd.Timestamp(date)): row
+            for (indicateur, date), row in stats.to_dict('index').items()}
+
+
+def get_slice_statistics(statistics, indicateur, date):
+    """Statistiques d'une tranche (None si la tranche est vide)"""
+    return statistics.get((indicateur, pd.Timestamp(date)))
+
+
+def describe_values(values):
+    """Moyenne, médiane et écart-type de valeurs (manquants ignorés), comme compute_slice_statistics"""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    return {
+        'mean': float(values.mean()) if len(values) else np.nan,
+        'median': float(np.median(values)) if len(values) else np.nan,
+        # Écart-type d'échantillon (ddof=1), comme pandas
+        'std': float(values.std(ddof=1)) if len(values) > 1 else np.nan,
+        'count': int(len(values)),
+    }
+
+
+def compute_change(before, after, relative=False):
+    """Écart entre deux dates, territoire par territoire
+
+    Absolu (après - avant) ou relatif en % de la valeur de départ (NaN si elle est nulle).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = after - before
+        if relative:
+            change = np.where(before != 0, change / np.abs(before) * 100, np.nan)
+    return change
+
+
+def frames_range(values, percentiles=None):
+    """Étendue de couleur commune à toutes les dates d'un bloc territoires × dates
+
+    Minimum et maximum, ou percentiles (ex. (5, 95)) calculés sur toutes les valeurs.
+    """
+    finite = values[~np.isnan(values)]
+    if finite.size == 0:
+        return None
+    if percentiles is not None:
+        low, high = np.percentile(finite, percentiles)
+        return [float(low), float(high)]
+    return [float(finite.min()), float(finite.max())]
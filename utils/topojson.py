@@ -0,0 +1,138 @@
+from itertools import chain
+import numpy as np
+
+# Encodage TopoJSON : chaque frontière partagée est stockée une seule fois (arc),
+# en coordonnées entières quantifiées et codées en différences successives.
+
+
+def _quantize_ring(ring, translate, grid_size):
+    """Ring GeoJSON fermé -> liste ouverte de points entiers sans doublons consécutifs"""
+    points = []
+    for x, y in ring[:-1]:
+        point = (int(round((x - translate[0]) / grid_size)), int(round((y - translate[1]) / grid_size)))
+        if not points or points[-1] != point:
+            points.append(point)
+    while len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def _polygons(geometry):
+    """Liste des polygones (listes de rings) d'une géométrie surfacique"""
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    return geometry['coordinates']
+
+
+def _rotate(ring, start):
+    return ring[start:] + ring[:start]
+
+
+class _ArcBuilder:
+    """Découpe les rings aux jonctions et déduplique les arcs identiques"""
+
+    def __init__(self, rings):
+        # Une jonction est un point relié à plus de deux voisins distincts
+        neighbors = {}
+        for ring in rings:
+            n = len(ring)
+            for i, point in enumerate(ring):
+                neighbors.setdefault(point, set()).update((ring[i - 1], ring[(i + 1) % n]))
+        self.junctions = {point for point, near in neighbors.items() if len(near) > 2}
+        self.arcs = []
+        self.index = {}
+
+    def _arc_id(self, points):
+        key = tuple(points)
+        if key in self.index:
+            return self.index[key]
+        reverse_key = key[::-1]
+        if reverse_key in self.index:
+            return ~self.index[reverse_key]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(points)
+        return self.index[key]
+
+    def ring_arcs(self, ring):
+        """Indices des arcs qui composent un ring (négatif = arc parcouru à l'envers)"""
+        cuts = [i for i, point in enumerate(ring) if point in self.junctions]
+        if not cuts:
+            # Ring sans jonction : départ au plus petit point, pour reconnaître
+            # le même ring parcouru dans l'autre sens par le polygone voisin
+            ring = _rotate(ring, ring.index(min(ring)))
+            return [self._arc_id(ring + ring[:1])]
+        ring = _rotate(ring, cuts[0])
+        cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+        closed = ring + ring[:1]
+        return [self._arc_id(closed[start:stop + 1]) for start, stop in zip(cuts[:-1], cuts[1:])]
+
+
+def encode_topojson(features, object_name, grid_size):
+    """Encode une liste de features GeoJSON (Polygon/MultiPolygon) en TopoJSON quantifié"""
+    all_coords = [point for feature in features for polygon in _polygons(feature['geometry'])
+                  for ring in polygon for point in ring]
+    translate = [min(x for x, _ in all_coords), min(y for _, y in all_coords)]
+
+    quantized = []
+    for feature in features:
+        quantized.append([[_quantize_ring(ring, translate, grid_size) for ring in polygon]
+                          for polygon in _polygons(feature['geometry'])])
+    builder = _ArcBuilder([ring for polygons in quantized for polygon in polygons for ring in polygon if ring])
+
+    geometries = []
+    for feature, polygons in zip(features, quantized):
+        arcs = [[builder.ring_arcs(ring) for ring in polygon if len(ring) > 2] for polygon in polygons]
+        arcs = [polygon for polygon in arcs if polygon]
+        geometry = {'type': 'MultiPolygon', 'arcs': arcs} if len(arcs) > 1 else {'type': 'Polygon', 'arcs': arcs[0]}
+        geometry['properties'] = feature.get('properties', {})
+        geometries.append(geometry)
+
+    # Codage différentiel : premier point absolu, puis écarts au point précédent
+    delta_arcs = []
+    for arc in builder.arcs:
+        delta = [list(arc[0])]
+        delta.extend([x1 - x0, y1 - y0] for (x0, y0), (x1, y1) in zip(arc[:-1], arc[1:]))
+        delta_arcs.append(delta)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [grid_size, grid_size], 'translate': translate},
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': delta_arcs,
+    }
+
+
+def decode_arcs(topology):
+    """Décode tous les arcs en coordonnées (listes de [lon, lat]) en une passe vectorisée"""
+    arcs = topology['arcs']
+    lengths = np.fromiter(map(len, arcs), dtype=np.int64, count=len(arcs))
+    flat = np.fromiter(chain.from_iterable(chain.from_iterable(arcs)), dtype=np.int64,
+                       count=2 * int(lengths.sum())).reshape(-1, 2)
+    # Somme cumulée par arc : cumul global moins le cumul à la fin de l'arc précédent
+    cumulative = np.cumsum(flat, axis=0)
+    ends = np.cumsum(lengths)
+    offsets = np.vstack([[0, 0], cumulative[ends[:-1] - 1]])
+    absolute = cumulative - np.repeat(offsets, lengths, axis=0)
+
+    transform = topology['transform']
+    decimals = max(0, int(np.ceil(-np.log10(min(transform['scale'])))))
+    coords = (absolute * transform['scale'] + transform['translate']).round(decimals).tolist()
+    starts = np.concatenate(([0], ends[:-1])).tolist()
+    return [coords[start:end] for start, end in zip(starts, ends.tolist())]
+
+
+def _ring_coordinates(arc_ids, arcs):
+    ring = []
+    for arc_id in arc_ids:
+        points = arcs[arc_id] if arc_id >= 0 else arcs[~arc_id][::-1]
+        ring.extend(points if not ring else points[1:])
+    return ring
+
+
+def decode_geometry(geometry, arcs):
+    """Reconstruit la géométrie GeoJSON d'une géométrie TopoJSON"""
+    if geometry['type'] == 'Polygon':
+        coordinates = [_ring_coordinates(ring, arcs) for ring in geometry['arcs']]
+    else:
+        coordinates = [[_ring_coordinates(ring, arcs) for ring in polygon] for polygon in geometry['arcs']]
+    return {'type': geometry['type'], 'coordinates': coordinates}